@@ -0,0 +1,115 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Compares moving image buffers between the bot and an image worker by pickling them through a pipe (the old way) against passing shared memory handles.
+# Every case runs in a fresh process so that peak RSS is not polluted by the previous one.
+#
+# Usage (from the Life directory): python -m benchmarks.image_transport
+
+import io
+import multiprocessing
+import multiprocessing.connection
+import os
+import resource
+import time
+
+from utilities.imaging import SharedImage
+
+SIZES = [1, 10, 25]
+ROUNDS = 5
+
+
+def _pipe_echo(connection: multiprocessing.connection.Connection) -> None:
+
+    while (image_bytes := connection.recv()) is not None:
+        buffer = io.BytesIO(image_bytes)
+        connection.send(io.BytesIO(buffer.getvalue()))
+
+
+def _shared_memory_echo(connection: multiprocessing.connection.Connection) -> None:
+
+    while (handle := connection.recv()) is not None:
+
+        source = SharedImage.attach(*handle)
+        image_bytes = bytes(source.buffer)
+        source.close()
+
+        output = SharedImage.create(image_bytes)
+        connection.send(output.handle)
+        output.close()
+
+
+def _run_pipe(connection: multiprocessing.connection.Connection, image_bytes: bytes) -> None:
+
+    connection.send(image_bytes)
+    connection.recv().close()
+
+
+def _run_shared_memory(connection: multiprocessing.connection.Connection, image_bytes: bytes) -> None:
+
+    source = SharedImage.create(image_bytes)
+    connection.send(source.handle)
+
+    output = SharedImage.attach(*connection.recv())
+    output.buffer.tobytes()  # Touch the result like the uploader would.
+    output.unlink()
+    source.unlink()
+
+
+def _case(mode: str, size: int, results: multiprocessing.Queue) -> None:
+
+    image_bytes = os.urandom(size * 2 ** 20)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    parent_connection, child_connection = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=_pipe_echo if mode == 'pipe' else _shared_memory_echo, args=(child_connection,))
+    worker.start()
+
+    run = _run_pipe if mode == 'pipe' else _run_shared_memory
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        run(parent_connection, image_bytes)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+
+    parent_connection.send(None)
+    worker.join()
+
+    results.put({
+        'mode':      mode,
+        'size':      size,
+        'time_ms':   elapsed * 1000,
+        'parent_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024,
+        'worker_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    })
+
+
+def main() -> None:
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+
+    print(f'{"Mode":<15}|{"Size":>7} |{"Time / round":>14} |{"Bot peak RSS +":>16} |{"Worker peak RSS":>17}')
+
+    for size in SIZES:
+        for mode in ('pipe', 'shared_memory'):
+
+            process = context.Process(target=_case, args=(mode, size, results))
+            process.start()
+            result = results.get()
+            process.join()
+
+            print(f'{result["mode"]:<15}|{result["size"]:>5}MB |{result["time_ms"]:>12.2f}ms |{result["parent_mb"]:>14.1f}MB |{result["worker_mb"]:>15.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
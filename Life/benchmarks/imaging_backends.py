@@ -0,0 +1,85 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Times every operation that has a NumPy implementation against its Wand one, on every format it handles, then writes whichever backend was
+# faster for each operation to resources/imaging_backends.json. The bot reads that file on startup to decide which backend to use.
+#
+# Usage (from the Life directory): python -m benchmarks.imaging_backends
+
+import io
+import json
+import time
+
+import numpy
+from PIL import Image
+
+from utilities import array_imaging, imaging
+
+ROUNDS = 5
+SIZE = (1024, 768)
+
+
+def _sample(image_format: str) -> bytes:
+
+    width, height = SIZE
+    gradient = numpy.linspace(0, 255, width, dtype=numpy.uint8)[numpy.newaxis, :, numpy.newaxis].repeat(height, axis=0).repeat(3, axis=2)
+    generator = numpy.random.default_rng(0)
+
+    image = Image.fromarray(numpy.clip(gradient + generator.integers(0, 32, gradient.shape), 0, 255).astype(numpy.uint8), 'RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+
+    return buffer.getvalue()
+
+
+def _time(function, *args, **kwargs) -> float:
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        function(*args, **kwargs)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main() -> None:
+
+    samples = {image_format: _sample(image_format.upper()) for image_format in sorted(array_imaging.FORMATS)}
+
+    backends, timings = {}, {}
+
+    print(f'{"Operation":<12}|{"Format":>7} |{"Wand":>11} |{"NumPy":>11}')
+
+    for edit_type in array_imaging.ARRAY_OPERATIONS:
+
+        steps = [(edit_type, {})]
+        timings[edit_type] = {}
+
+        for image_format, image_bytes in samples.items():
+
+            wand = _time(imaging._edit_task, [image_bytes], steps=steps)
+            array = _time(array_imaging.edit, image_bytes, steps)
+            timings[edit_type][image_format] = {'wand': round(wand, 2), 'numpy': round(array, 2)}
+
+            print(f'{edit_type:<12}|{image_format:>7} |{wand:>9.2f}ms |{array:>9.2f}ms')
+
+        wand_total = sum(timing['wand'] for timing in timings[edit_type].values())
+        array_total = sum(timing['numpy'] for timing in timings[edit_type].values())
+        backends[edit_type] = 'numpy' if array_total < wand_total else 'wand'
+
+    with array_imaging.BACKENDS_PATH.open('w') as file:
+        json.dump({'backends': backends, 'timings_ms': timings}, file, indent=4)
+
+    print(f'\nWrote backend choices to {array_imaging.BACKENDS_PATH}')
+
+
+if __name__ == '__main__':
+    main()
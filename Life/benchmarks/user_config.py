@@ -0,0 +1,127 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Compares building user configs the old way (every column converted to pendulum / discord objects up front, and the record kept around) against
+# the compact UserConfig that only keeps plain values and converts them when read. No database is needed, the rows are generated here.
+#
+# Usage (from the Life directory): python -m benchmarks.user_config
+
+import datetime as dt
+import gc
+import time
+import tracemalloc
+from typing import Iterator, Optional
+
+import discord
+import pendulum
+
+from utilities import objects
+
+SIZES = [100_000, 1_000_000]
+TIMEZONES = ['UTC', 'Europe/London', 'America/New_York', 'Asia/Tokyo', 'Australia/Sydney']
+
+
+class LegacyUserConfig:
+
+    __slots__ = 'data', 'id', 'created_at', 'blacklisted', 'blacklisted_reason', 'colour', 'timezone', 'timezone_private', 'birthday', 'birthday_private', 'xp', 'coins', \
+                'daily_collected', 'daily_streak', 'weekly_collected', 'weekly_streak', 'monthly_collected', 'monthly_streak', 'notifications', 'reminders', 'todos', \
+                'requires_db_update'
+
+    def __init__(self, data: dict) -> None:
+        self.data = data
+
+        self.id: int = data.get('id')
+        self.created_at = pendulum.instance(data.get('created_at'), tz='UTC')
+
+        self.blacklisted: bool = data.get('blacklisted')
+        self.blacklisted_reason: Optional[str] = data.get('blacklisted_reason')
+
+        self.colour = discord.Colour(int(data.get('colour'), 16))
+        self.timezone = pendulum.timezone(data.get('timezone'))
+        self.timezone_private: bool = data.get('timezone_private')
+        self.birthday = pendulum.parse(data.get('birthday').isoformat(), tz='UTC')
+        self.birthday_private: bool = data.get('birthday_private')
+
+        self.xp: int = data.get('xp')
+        self.coins: int = data.get('coins')
+
+        self.daily_collected = pendulum.instance(data.get('daily_collected'), tz='UTC')
+        self.daily_streak: int = data.get('daily_streak')
+        self.weekly_collected = pendulum.instance(data.get('weekly_collected'), tz='UTC')
+        self.weekly_streak: int = data.get('weekly_streak')
+        self.monthly_collected = pendulum.instance(data.get('monthly_collected'), tz='UTC')
+        self.monthly_streak: int = data.get('monthly_streak')
+
+        self.notifications = None
+        self.todos = {}
+        self.reminders = {}
+
+        self.requires_db_update = set()
+
+
+def _rows(size: int) -> Iterator[dict]:
+
+    # Generated as they are consumed, like rows off the cursor, so a config that keeps its row alive is charged for it and one that doesn't isn't.
+    now = dt.datetime(2021, 5, 1)
+
+    return (
+        {
+            'id':                 user_id,
+            'created_at':         now - dt.timedelta(seconds=user_id),
+            'blacklisted':        False,
+            'blacklisted_reason': None,
+            'colour':             '0xF1C40F',
+            'timezone':           TIMEZONES[user_id % len(TIMEZONES)],
+            'timezone_private':   False,
+            'birthday':           dt.date(2000, 1, 1) + dt.timedelta(days=user_id % 3650),
+            'birthday_private':   False,
+            'xp':                 user_id % 100000,
+            'coins':              user_id % 5000,
+            'daily_collected':    now,
+            'daily_streak':       0,
+            'weekly_collected':   now,
+            'weekly_streak':      0,
+            'monthly_collected':  now,
+            'monthly_streak':     0,
+        }
+        for user_id in range(size)
+    )
+
+
+def _measure(cls: type, size: int) -> tuple[float, float]:
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    configs = [cls(row) for row in _rows(size)]
+
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del configs
+    return elapsed, current / size
+
+
+def main() -> None:
+
+    print(f'{"Class":<8}|{"Users":>10} |{"Time":>9} |{"Configs / s":>13} |{"Bytes / user":>14}')
+
+    for size in SIZES:
+        for name, cls in (('old', LegacyUserConfig), ('new', objects.UserConfig)):
+            elapsed, per_user = _measure(cls, size)
+            print(f'{name:<8}|{size:>10} |{elapsed:>8.2f}s |{size / elapsed:>13.0f} |{per_user:>14.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Compares the old startup load of user configs (two full fetches paired up with zip) against the joined, cursor streamed one. The users are
+# generated in a throwaway schema on the database from config.POSTGRESQL, which is dropped again afterwards.
+#
+# Usage (from the Life directory): python -m benchmarks.user_load
+
+import asyncio
+import time
+import tracemalloc
+
+import asyncpg
+
+import config
+from managers import user_manager
+from utilities import objects
+
+SCHEMA = 'life_user_load_benchmark'
+SIZES = [100_000, 1_000_000]
+
+SETUP = f'''
+CREATE SCHEMA {SCHEMA};
+
+CREATE TABLE {SCHEMA}.users (
+    id                 bigint PRIMARY KEY,
+    created_at         timestamp NOT NULL DEFAULT now(),
+    blacklisted        boolean NOT NULL DEFAULT false,
+    blacklisted_reason text,
+    colour             text NOT NULL DEFAULT '0xF1C40F',
+    timezone           text NOT NULL DEFAULT 'UTC',
+    timezone_private   boolean NOT NULL DEFAULT false,
+    birthday           date NOT NULL DEFAULT '2020-01-01',
+    birthday_private   boolean NOT NULL DEFAULT false,
+    xp                 bigint NOT NULL DEFAULT 0,
+    coins              bigint NOT NULL DEFAULT 0,
+    daily_collected    timestamp NOT NULL DEFAULT now(),
+    daily_streak       integer NOT NULL DEFAULT 0,
+    weekly_collected   timestamp NOT NULL DEFAULT now(),
+    weekly_streak      integer NOT NULL DEFAULT 0,
+    monthly_collected  timestamp NOT NULL DEFAULT now(),
+    monthly_streak     integer NOT NULL DEFAULT 0
+);
+
+CREATE TABLE {SCHEMA}.notifications (
+    id        serial PRIMARY KEY,
+    user_id   bigint NOT NULL REFERENCES {SCHEMA}.users (id),
+    level_ups boolean NOT NULL DEFAULT false
+);
+'''
+
+
+async def _old_load(connection: asyncpg.Connection) -> int:
+
+    configs = {}
+
+    users = await connection.fetch('SELECT * FROM users')
+    notifications = await connection.fetch('SELECT * FROM notifications')
+
+    for config_data, notification_data in zip(users, notifications):
+        user_config = objects.UserConfig(data=config_data)
+        user_config.notifications = objects.Notifications(data=notification_data)
+        configs[user_config.id] = user_config
+
+    return len(configs)
+
+
+async def _new_load(connection: asyncpg.Connection) -> int:
+
+    configs = {}
+
+    async for user_config in user_manager.stream_configs(connection):
+        configs[user_config.id] = user_config
+
+    return len(configs)
+
+
+async def _measure(connection: asyncpg.Connection, load) -> tuple[int, float, float]:
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    rows = await load(connection)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return rows, elapsed, peak / 2 ** 20
+
+
+async def main() -> None:
+
+    connection = await asyncpg.connect(**config.POSTGRESQL)
+
+    try:
+        await connection.execute(SETUP)
+        await connection.execute(f'SET search_path TO {SCHEMA}')
+
+        print(f'{"Loader":<8}|{"Users":>10} |{"Time":>9} |{"Rows / s":>11} |{"Peak memory":>13}')
+
+        loaded = 0
+        for size in SIZES:
+
+            await connection.execute('INSERT INTO users (id, xp, coins) SELECT id, id % 100000, id % 5000 FROM generate_series($1::bigint, $2::bigint) AS id', loaded + 1, size)
+            await connection.execute('INSERT INTO notifications (user_id) SELECT id FROM generate_series($1::bigint, $2::bigint) AS id', loaded + 1, size)
+            await connection.execute('ANALYZE users; ANALYZE notifications')
+            loaded = size
+
+            for name, load in (('old', _old_load), ('new', _new_load)):
+                rows, elapsed, peak = await _measure(connection, load)
+                print(f'{name:<8}|{rows:>10} |{elapsed:>8.2f}s |{rows / elapsed:>11.0f} |{peak:>11.1f}MB')
+
+    finally:
+        await connection.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        await connection.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Pushes a burst of messages through Economy.on_message with the old redis cooldown (EXISTS then SETEX per message), the in-process wheel, and
+# the wheel with its redis mirror, and reports messages per second. The user manager is replaced with an in-memory stand in so only the cooldown
+# check is measured, redis is the one from config.REDIS. Cooldown keys are written under a throwaway prefix and deleted afterwards.
+#
+# Usage (from the Life directory): python -m benchmarks.xp_cooldown
+
+import asyncio
+import random
+import time
+import types
+
+import aredis
+import discord
+
+import config
+from cogs.economy import Economy
+from utilities import cooldowns
+
+MESSAGES = 200_000
+USERS = [1_000, 20_000]
+CONCURRENCY = 500
+
+
+class _UserManager:
+
+    def __init__(self) -> None:
+        self.user_config = types.SimpleNamespace(next_level_xp=2 ** 63)
+
+    async def get_or_create_config(self, user_id: int, *, wait: bool = True) -> types.SimpleNamespace:
+        return self.user_config
+
+    async def set_xp(self, user_id: int, *, xp: int) -> None:
+        pass
+
+
+async def _legacy_on_message(cog: Economy, message: discord.Message) -> None:
+
+    if message.author.bot:
+        return
+
+    if await cog.bot.redis.exists(f'benchmark_{message.author.id}_xp_gain') is True:
+        return
+
+    user_config = await cog.bot.user_manager.get_or_create_config(message.author.id)
+
+    xp = random.randint(10, 25)
+
+    if xp >= user_config.next_level_xp:
+        cog.bot.dispatch('xp_level_up', user_config, message)
+
+    await cog.bot.user_manager.set_xp(message.author.id, xp=xp)
+    await cog.bot.redis.setex(name=f'benchmark_{message.author.id}_xp_gain', time=60, value=None)
+
+
+async def _run(handler, messages: list[types.SimpleNamespace]) -> float:
+
+    start = time.perf_counter()
+
+    for index in range(0, len(messages), CONCURRENCY):
+        await asyncio.gather(*(handler(message) for message in messages[index:index + CONCURRENCY]))
+
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def main() -> None:
+
+    redis = aredis.StrictRedis(**config.REDIS)
+    bot = types.SimpleNamespace(redis=redis, user_manager=_UserManager(), dispatch=lambda *args: None)
+
+    # The keys the bot itself uses are avoided so that a running instance is not affected.
+    cooldowns.XPCooldown.key = staticmethod(lambda user_id: f'benchmark_{user_id}_xp_gain')
+
+    print(f'{"Mode":<14}|{"Users":>8} |{"Messages / s":>14}')
+
+    try:
+        for users in USERS:
+
+            messages = [types.SimpleNamespace(author=types.SimpleNamespace(id=random.randrange(users), bot=False)) for _ in range(MESSAGES)]
+
+            for mode in ('redis', 'wheel', 'wheel + mirror'):
+
+                await redis.eval("for _, key in ipairs(redis.call('KEYS', 'benchmark_*')) do redis.call('DEL', key) end", 0)
+
+                cog = Economy(bot)
+                cog.xp_cooldown = cooldowns.XPCooldown(seconds=60, redis=redis if mode == 'wheel + mirror' else None)
+
+                handler = (lambda message: _legacy_on_message(cog, message)) if mode == 'redis' else cog.on_message
+                print(f'{mode:<14}|{users:>8} |{await _run(handler, messages):>14.0f}')
+
+    finally:
+        await redis.eval("for _, key in ipairs(redis.call('KEYS', 'benchmark_*')) do redis.call('DEL', key) end", 0)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -10,7 +10,9 @@
 #  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
 #
 
+import asyncio
 import collections
+import contextlib
 import logging
 import time
 from typing import Optional, Union
@@ -28,7 +30,7 @@ from discord.ext import commands
 
 import config
 from managers import guild_manager, reminder_manager, tag_manager, todo_manager, user_manager
-from utilities import context, help  # skipcq: PYL-W0622
+from utilities import context, help, imaging  # skipcq: PYL-W0622
 
 __log__ = logging.getLogger(__name__)
 
@@ -73,6 +75,11 @@ class Life(commands.AutoShardedBot):
         self.tag_manager: tag_manager.TagManager = tag_manager.TagManager(bot=self)
         self.todo_manager: todo_manager.TodoManager = todo_manager.TodoManager(bot=self)
 
+        self.image_pool: imaging.ImagePool = imaging.ImagePool(
+                size=config.IMAGE_WORKERS, timeout=config.IMAGE_TIMEOUT, guild_limit=config.IMAGE_GUILD_LIMIT, notice_after=config.IMAGE_QUEUE_NOTICE
+        )
+        self.cdn: imaging.CDNUploader = imaging.CDNUploader()
+
     async def get_context(self, message: discord.Message, *, cls=context.Context) -> context.Context:
         return await super().get_context(message, cls=cls)
 
@@ -114,6 +121,10 @@ class Life(commands.AutoShardedBot):
             print(f'[REDIS] Successful connection to Redis DB number \'{config.REDIS["db"]}\'. \n')
             self.redis = redis
 
+        self.image_pool.start()
+        __log__.info(f'[IMAGE POOL] Started with {self.image_pool.size} workers.')
+        print(f'[IMAGE POOL] Started with {self.image_pool.size} workers.\n')
+
         for extension in config.EXTENSIONS:
             try:
                 self.load_extension(extension)
@@ -139,12 +150,28 @@ class Life(commands.AutoShardedBot):
         await self.mystbin.close()
         await self.ksoft.close()
         await self.session.close()
+        await self.cdn.close()
         await self.spotify.close()
         await self.spotify_http.close()
 
         __log__.info('[BOT] Closing bot down.')
         print('[BOT] Closing bot down.')
 
+        __log__.info('[BOT] Closing image workers.')
+        print('[BOT] Closing image workers.')
+        await self.image_pool.close()
+
+        __log__.info('[BOT] Flushing user configs.')
+        print('[DB] Flushing user configs.')
+        # Any write that is already running is cancelled and waited for, anything it had taken is put back for the final ones below to pick up.
+        for loop in (self.user_manager.insert_configs, self.user_manager.update_database):
+            loop.cancel()
+            if (task := loop.get_task()) is not None:
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        await self.user_manager.insert_provisional()
+        await self.user_manager.flush()
+
         __log__.info('[BOT] Closing database connection.')
         print('[DB] Closing database connection.')
         await self.db.close()
@@ -172,8 +199,11 @@ class Life(commands.AutoShardedBot):
 
     async def command_check(self, ctx: context.Context) -> bool:
 
-        if ctx.user_config.blacklisted is True and ctx.command.qualified_name not in {'help', 'support'}:
-            raise commands.CheckFailure(f'You are blacklisted from using this bot with the reason:\n\n`{ctx.user_config.blacklisted_reason}`')
+        # Makes sure the authors config is loaded before the command runs, so `ctx.user_config` is accurate within it.
+        user_config = await ctx.fetch_user_config()
+
+        if user_config.blacklisted is True and ctx.command.qualified_name not in {'help', 'support'}:
+            raise commands.CheckFailure(f'You are blacklisted from using this bot with the reason:\n\n`{user_config.blacklisted_reason}`')
         if ctx.guild_config.blacklisted is True and ctx.command.qualified_name not in {'help', 'support'}:
             raise commands.CheckFailure(f'This guild is blacklisted from using this bot with the reason:\n\n`{ctx.guild_config.blacklisted_reason}`')
 
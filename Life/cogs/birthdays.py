@@ -36,7 +36,7 @@ class Birthdays(commands.Cog):
         if person is None:
             person = ctx.author
 
-        user_config = self.bot.user_manager.get_config(person.id)
+        user_config = await self.bot.user_manager.fetch_config(person.id)
 
         if user_config.birthday == self.default_birthday:
             raise exceptions.ArgumentError(f'`{person}` has not set their birthday.')
@@ -115,6 +115,8 @@ class Birthdays(commands.Cog):
         Display a list of upcoming birthdays within the server.
         """
 
+        await self.bot.user_manager.prefetch_members(ctx.guild)
+
         configs = dict(
                 sorted(
                         filter(
@@ -145,6 +147,8 @@ class Birthdays(commands.Cog):
         Display a list of birthdays within the server.
         """
 
+        await self.bot.user_manager.prefetch_members(ctx.guild)
+
         configs = dict(
                 sorted(
                         filter(
@@ -172,6 +176,8 @@ class Birthdays(commands.Cog):
         Display the next person to have a birthday within the server.
         """
 
+        await self.bot.user_manager.prefetch_members(ctx.guild)
+
         configs = dict(
                 sorted(
                         filter(
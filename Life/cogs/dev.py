@@ -132,6 +132,54 @@ class Dev(commands.Cog):
         embed = discord.Embed(title=f'{self.bot.user.name} socket stats.', colour=ctx.colour, description='\n'.join(description))
         await ctx.send(embed=embed)
 
+    @commands.is_owner()
+    @dev.command(name='imaging', aliases=['img'], hidden=True)
+    async def dev_imaging(self, ctx: context.Context) -> None:
+        """
+        Displays stats about the image worker pool and cdn uploads.
+        """
+
+        description = ['```py']
+        for name, value in self.bot.image_pool.metrics.items():
+            description.append(f'{name:29} | {value}')
+        description.append('')
+        for name, value in self.bot.cdn.metrics.items():
+            description.append(f'{name:29} | {value}')
+        description.append('```')
+
+        embed = discord.Embed(title=f'{self.bot.user.name} image worker stats.', colour=ctx.colour, description='\n'.join(description))
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @dev.command(name='users', hidden=True)
+    async def dev_users(self, ctx: context.Context) -> None:
+        """
+        Displays stats about new users waiting to be inserted into the database.
+        """
+
+        description = ['```py']
+        for name, value in self.bot.user_manager.insert_metrics.items():
+            description.append(f'{name:29} | {value}')
+        description.append('```')
+
+        embed = discord.Embed(title=f'{self.bot.user.name} user creation stats.', colour=ctx.colour, description='\n'.join(description))
+        await ctx.send(embed=embed)
+
+    @commands.is_owner()
+    @dev.command(name='reminders', hidden=True)
+    async def dev_reminders(self, ctx: context.Context) -> None:
+        """
+        Displays stats about reminder scheduling and delivery.
+        """
+
+        description = ['```py']
+        for name, value in self.bot.reminder_manager.metrics.items():
+            description.append(f'{name:29} | {value}')
+        description.append('```')
+
+        embed = discord.Embed(title=f'{self.bot.user.name} reminder stats.', colour=ctx.colour, description='\n'.join(description))
+        await ctx.send(embed=embed)
+
     @dev.group(name='blacklist', aliases=['bl'], hidden=True, invoke_without_command=True)
     async def dev_blacklist(self, ctx: context.Context) -> None:
         """
@@ -146,11 +194,12 @@ class Dev(commands.Cog):
         Display a list of blacklisted users.
         """
 
-        blacklisted = [user_config for user_config in self.bot.user_manager.configs.values() if user_config.blacklisted is True]
+        # Asks the database since user configs may not all be in memory, blacklisting is written straight through so it is always up to date.
+        blacklisted = await self.bot.db.fetch('SELECT id, blacklisted_reason FROM users WHERE blacklisted IS TRUE ORDER BY id')
         if not blacklisted:
             raise exceptions.ArgumentError('There are no blacklisted users.')
 
-        entries = [f'{user_config.id:<19} | {user_config.blacklisted_reason}' for user_config in blacklisted]
+        entries = [f'{data["id"]:<19} | {data["blacklisted_reason"]}' for data in blacklisted]
         header = 'User id             | Reason\n'
         await ctx.paginate(entries=entries, per_page=15, header=header, codeblock=True)
 
@@ -166,7 +215,7 @@ class Dev(commands.Cog):
         if reason == 'No reason':
             reason = f'{user.name} - No reason'
 
-        user_config = self.bot.user_manager.get_config(user.id)
+        user_config = await self.bot.user_manager.fetch_config(user.id)
         if user_config.blacklisted is True:
             raise exceptions.ArgumentError('That user is already blacklisted.')
 
@@ -181,7 +230,7 @@ class Dev(commands.Cog):
         `user`: The user to remove from the blacklist.
         """
 
-        user_config = self.bot.user_manager.get_config(user.id)
+        user_config = await self.bot.user_manager.fetch_config(user.id)
         if user_config.blacklisted is False:
             raise exceptions.ArgumentError('That user is not blacklisted.')
 
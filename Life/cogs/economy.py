@@ -16,8 +16,9 @@ import discord
 import pendulum
 from discord.ext import commands
 
+import config
 from bot import Life
-from utilities import context, enums, exceptions, objects, utils
+from utilities import context, cooldowns, enums, exceptions, objects, paginators, utils
 
 
 class Economy(commands.Cog):
@@ -25,6 +26,8 @@ class Economy(commands.Cog):
     def __init__(self, bot: Life) -> None:
         self.bot = bot
 
+        self.xp_cooldown = cooldowns.XPCooldown(seconds=config.XP_COOLDOWN['seconds'], redis=self.bot.redis if config.XP_COOLDOWN['redis_mirror'] else None)
+
         self.claims = {
             'daily': {
                 'collected': enums.Updateable.DAILY_COLLECTED,
@@ -64,10 +67,10 @@ class Economy(commands.Cog):
         if message.author.bot:
             return
 
-        if await self.bot.redis.exists(f'{message.author.id}_xp_gain') is True:
+        if not await self.xp_cooldown.acquire(message.author.id):
             return
 
-        user_config = await self.bot.user_manager.get_or_create_config(message.author.id)
+        user_config = await self.bot.user_manager.get_or_create_config(message.author.id, wait=False)
 
         xp = random.randint(10, 25)
 
@@ -75,7 +78,18 @@ class Economy(commands.Cog):
             self.bot.dispatch('xp_level_up', user_config, message)
 
         await self.bot.user_manager.set_xp(message.author.id, xp=xp)
-        await self.bot.redis.setex(name=f'{message.author.id}_xp_gain', time=60, value=None)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member) -> None:
+        self.bot.user_manager.add_member(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member) -> None:
+        self.bot.user_manager.remove_member(member)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.bot.user_manager.drop_guild_ranks(guild.id)
 
     @commands.Cog.listener()
     async def on_xp_level_up(self, user_config: objects.UserConfig, message: discord.Message) -> None:
@@ -115,37 +129,41 @@ class Economy(commands.Cog):
         user_config = await self.bot.user_manager.get_or_create_config(ctx.author.id)
         now = pendulum.now(tz='UTC')
 
-        time_when_claimable = getattr(user_config, self.claims[claim]['collected'].value).add(days=self.claims[claim]['days_before_claimable'])
+        bundle = self.claims[claim]
+        collected = getattr(user_config, bundle['collected'].value)
+
+        time_when_claimable = collected.add(days=bundle['days_before_claimable'])
         if now < time_when_claimable:
             time_difference = utils.format_difference(datetime=time_when_claimable, suppress=[])
             raise exceptions.ArgumentError(f'Your `{claim}` bundle is currently on cooldown. Retry the command in `{time_difference}`.')
 
-        coins = self.claims[claim]['base_coins']
+        coins = bundle['base_coins']
+        changes = {bundle['collected']: (enums.Operation.SET, now)}
 
-        embed = discord.Embed(
-                colour=ctx.colour, title=f'{claim.title()} bundle claim:',
-                description=f'You gained `{coins}` coins for claiming your `{claim.title()}` bundle!\n\n'
-        )
-
-        time_when_streak_expires = getattr(user_config, self.claims[claim]['collected'].value).add(days=self.claims[claim]['days_before_expiry'])
+        time_when_streak_expires = collected.add(days=bundle['days_before_expiry'])
         if now < time_when_streak_expires:
 
-            if getattr(user_config, self.claims[claim]['streak'].value) + 1 >= self.claims[claim]['streak_threshold']:
-                await self.bot.user_manager.set_bundle_streak(ctx.author.id, bundle_type=self.claims[claim]['streak'], operation=enums.Operation.RESET)
-                embed.description += f'You were awarded an extra `{self.claims[claim]["streak_coins"] - self.claims[claim]["base_coins"]}` coins for maintaining your ' \
-                                     f'`{claim.title()}` streak which has now been reset to 0.\n\n'
+            streak = getattr(user_config, bundle['streak'].value) + 1
+
+            if streak >= bundle['streak_threshold']:
+                changes[bundle['streak']] = (enums.Operation.RESET, 0)
+                streak_text = f'You were awarded an extra `{bundle["streak_coins"] - bundle["base_coins"]}` coins for maintaining your ' \
+                              f'`{claim.title()}` streak which has now been reset to 0.\n\n'
             else:
-                await self.bot.user_manager.set_bundle_streak(ctx.author.id, bundle_type=self.claims[claim]['streak'], operation=enums.Operation.ADD, count=1)
-                embed.description += f'You are now on a `{getattr(user_config, self.claims[claim]["streak"].value)}` out of `{self.claims[claim]["streak_threshold"]}` ' \
-                                     f'`{claim.title()}` streak.\n\n'
+                changes[bundle['streak']] = (enums.Operation.ADD, 1)
+                streak_text = f'You are now on a `{streak}` out of `{bundle["streak_threshold"]}` `{claim.title()}` streak.\n\n'
 
         else:
+            changes[bundle['streak']] = (enums.Operation.RESET, 0)
+            streak_text = f'Your `{claim.title()}` streak is over because you didnt claim your bundle within {bundle["expired_reason"]} of the last claim.'
 
-            await self.bot.user_manager.set_bundle_streak(ctx.author.id, bundle_type=self.claims[claim]['streak'], operation=enums.Operation.RESET)
-            embed.description += f'Your `{claim.title()}` streak is over because you didnt claim your bundle within {self.claims[claim]["expired_reason"]} of the last claim.'
+        changes[enums.Updateable.COINS] = (enums.Operation.ADD, coins)
+        await self.bot.user_manager.update_config(ctx.author.id, changes)
 
-        await self.bot.user_manager.set_coins(ctx.author.id, coins=coins)
-        await self.bot.user_manager.set_bundle_collection(ctx.author.id, collection_type=self.claims[claim]['collected'])
+        embed = discord.Embed(
+                colour=ctx.colour, title=f'{claim.title()} bundle claim:',
+                description=f'You gained `{bundle["base_coins"]}` coins for claiming your `{claim.title()}` bundle!\n\n{streak_text}'
+        )
         await ctx.send(embed=embed)
 
     @commands.command(name='profile')
@@ -159,7 +177,8 @@ class Economy(commands.Cog):
         if not member:
             member = ctx.author
 
-        user_config = self.bot.user_manager.get_config(member.id)
+        await self.bot.user_manager.prefetch_members(ctx.guild)
+        user_config = await self.bot.user_manager.fetch_config(member.id)
 
         embed = discord.Embed(
                 colour=user_config.colour, title=f'{member}\'s profile',
@@ -180,18 +199,25 @@ class Economy(commands.Cog):
         `type`: The type of leaderboard to show, could be `xp`, `level` or `coins`
         """
 
-        leaderboard = self.bot.user_manager.leaderboard(lb_type=lb_type, guild_id=ctx.guild.id)
-        if not leaderboard:
-            raise exceptions.ArgumentError('There are no leaderboard stats.')
+        position = 0
+
+        async def fetch(page: int) -> list[str]:
+            nonlocal position
 
-        entries = [
-            f'{index + 1:<6} |{getattr(user_config, lb_type):<10} |{ctx.bot.get_user(user_id)}'
-            for index, (user_id, user_config) in enumerate(leaderboard)
-        ]
+            if position is None:
+                return []
+
+            leaderboard, position = self.bot.user_manager.leaderboard(lb_type=lb_type, guild_id=ctx.guild.id, position=position, limit=10)
+            return [f'{page * 10 + index + 1:<6} |{value:<10} |{ctx.bot.get_user(user_id)}' for index, (user_id, value) in enumerate(leaderboard)]
 
         title = f'`{lb_type.title()}` leaderboard in `{ctx.guild}`:'
         header = f'Rank   |{lb_type.title():<10} |Name\n'
-        await ctx.paginate_embed(entries=entries, per_page=10, title=title, header=header, codeblock=True)
+        paginator = paginators.LazyEmbedPaginator(ctx=ctx, fetch=fetch, per_page=10, title=title, header=header, codeblock=True)
+
+        if not await paginator.fetch_page(0):
+            raise exceptions.ArgumentError('There are no leaderboard stats.')
+
+        await paginator.paginate()
 
     @commands.command(name='global-leaderboard', aliases=['glb'])
     async def global_leaderboard(self, ctx: context.Context, lb_type: Literal['xp', 'level', 'coins'] = 'xp') -> None:
@@ -201,18 +227,25 @@ class Economy(commands.Cog):
         `lb_type`: The type of leaderboard to show, could be `xp`, `level` or `coins`
         """
 
-        leaderboard = self.bot.user_manager.leaderboard(lb_type=lb_type)
-        if not leaderboard:
-            raise exceptions.ArgumentError('There are no leaderboard stats.')
+        position = 0
+
+        async def fetch(page: int) -> list[str]:
+            nonlocal position
+
+            if position is None:
+                return []
 
-        entries = [
-            f'{index + 1:<6} |{getattr(user_config, lb_type):<10} |{ctx.bot.get_user(user_id)}'
-            for index, (user_id, user_config) in enumerate(leaderboard)
-        ]
+            leaderboard, position = self.bot.user_manager.leaderboard(lb_type=lb_type, position=position, limit=10)
+            return [f'{page * 10 + index + 1:<6} |{value:<10} |{ctx.bot.get_user(user_id)}' for index, (user_id, value) in enumerate(leaderboard)]
 
         title = f'`{lb_type.title()}` leaderboard across the whole bot.'
         header = f'Rank   |{lb_type.title():<10} |Name\n'
-        await ctx.paginate_embed(entries=entries, per_page=10, title=title, header=header, codeblock=True)
+        paginator = paginators.LazyEmbedPaginator(ctx=ctx, fetch=fetch, per_page=10, title=title, header=header, codeblock=True)
+
+        if not await paginator.fetch_page(0):
+            raise exceptions.ArgumentError('There are no leaderboard stats.')
+
+        await paginator.paginate()
 
     @commands.command(name='rank', aliases=['r'])
     async def rank(self, ctx: context.Context, member: Optional[discord.Member]) -> None:
@@ -253,7 +286,8 @@ class Economy(commands.Cog):
         if not member:
             member = ctx.author
 
-        await ctx.send(f'{member} has `{self.bot.user_manager.get_config(member.id).coins}` coins.')
+        user_config = await self.bot.user_manager.fetch_config(member.id)
+        await ctx.send(f'{member} has `{user_config.coins}` coins.')
 
 
 def setup(bot: Life) -> None:
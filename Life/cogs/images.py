@@ -12,7 +12,7 @@
 
 import random
 from inspect import Parameter
-from typing import Literal, Optional
+from typing import Any, Callable, Literal, NamedTuple, Optional
 
 from discord.ext import commands
 
@@ -37,6 +37,144 @@ def _transform(self, ctx, param):
 commands.Command.transform = _transform
 
 
+class Option(NamedTuple):
+    converter: Callable
+    default: Any = None
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    choices: Optional[tuple[str, ...]] = None
+
+
+NOISE_METHODS = ('uniform', 'gaussian', 'multiplicative_gaussian', 'impulse', 'laplacian', 'poisson', 'random')
+
+# The options of every image operation, in the order the pipeline command takes them positionally. The defaults mirror the commands below
+# and both the commands and the pipeline validate against these limits.
+OPERATION_OPTIONS: dict[str, dict[str, Option]] = {
+    'adaptive_blur':    {'radius': Option(float, 8, 0, 30), 'sigma': Option(float, 4, 0, 30)},
+    'adaptive_sharpen': {'radius': Option(float, 8, 0, 50), 'sigma': Option(float, 4, 0, 50)},
+    'blueshift':        {'factor': Option(float, 1.25, 0, 20)},
+    'blur':             {'radius': Option(float, 0, 0, 30), 'sigma': Option(float, 3, 0, 30)},
+    'border':           {'colour': Option(commands.ColourConverter), 'width': Option(int, 10), 'height': Option(int, 10)},
+    'edge':             {'radius': Option(float, 0, 0, 30), 'sigma': Option(float, 1, 0, 30)},
+    'charcoal':         {'radius': Option(float, 1.5, -10.0, 10.0), 'sigma': Option(float, 0.5, -5.0, 5.0)},
+    'colorize':         {'colour': Option(commands.ColourConverter)},
+    'despeckle':        {},
+    'floor':            {},
+    'emboss':           {'radius': Option(float, 3, 0, 30), 'sigma': Option(float, 1, 0, 30)},
+    'enhance':          {},
+    'flip':             {},
+    'flop':             {},
+    'frame':            {'matte': Option(commands.ColourConverter), 'width': Option(int, 20), 'height': Option(int, 20), 'inner_bevel': Option(int, 5), 'outer_bevel': Option(int, 10)},
+    'gaussian_blur':    {'radius': Option(float, 0, 0, 30), 'sigma': Option(float, 3, 0, 30)},
+    'implode':          {'amount': Option(float, 0.4, -20, 20)},
+    'kmeans':           {'number_colours': Option(int, 10, 1, 1024)},
+    'kuwahara':         {'radius': Option(float, 3, 0, 20), 'sigma': Option(float, 2.5, 0, 20)},
+    'motion_blur':      {'radius': Option(float, 20, 0, 30), 'sigma': Option(float, 10, 0, 30), 'angle': Option(int, 45)},
+    'negate':           {},
+    'noise':            {'attenuate': Option(float, 0.5, 0.0, 1.0), 'method': Option(str, 'impulse', choices=NOISE_METHODS)},
+    'oil_paint':        {'radius': Option(float, 2, 0, 30), 'sigma': Option(float, 1, 0, 30)},
+    'polaroid':         {'angle': Option(float, 0, -360, 360), 'caption': Option(str, None, maximum=100)},
+    'rotate':           {'degree': Option(int, 45, -360, 360)},
+    'sepia_tone':       {'threshold': Option(float, 0.8, 0.0, 1.0)},
+    'sharpen':          {'radius': Option(float, 8, 0, 50), 'sigma': Option(float, 4, 0, 50)},
+    'solarize':         {'threshold': Option(float, 0.5, 0.0, 1.0)},
+    'spread':           {'radius': Option(float, 2.0, 0, 50)},
+    'swirl':            {'degree': Option(int, 45, -360, 360)},
+    'transparentize':   {'transparency': Option(float, 0.5, 0.0, 1.0)},
+    'transpose':        {},
+    'transverse':       {},
+    'wave':             {},
+    'cube':             {},
+}
+
+# Command names that don't match the operation they run, so they can be used as pipeline steps too.
+OPERATION_ALIASES = {
+    'ab':         'adaptive_blur',
+    'as':         'adaptive_sharpen',
+    'blue_shift': 'blueshift',
+    'bs':         'blueshift',
+    'colourise':  'colorize',
+    'gb':         'gaussian_blur',
+    'explode':    'implode',
+    'colours':    'kmeans',
+    'colors':     'kmeans',
+    'mb':         'motion_blur',
+    'op':         'oil_paint',
+    'st':         'sepia_tone',
+}
+
+
+def _random_colour() -> str:
+    return '#%02X%02X%02X' % (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+
+
+def validate_options(edit_type: str, **options: Any) -> None:
+
+    for name, value in options.items():
+
+        option = OPERATION_OPTIONS[edit_type][name]
+        label = 'Number of colours' if name == 'number_colours' else name.replace('_', ' ').capitalize()
+
+        if value is None:
+            continue
+
+        if isinstance(value, str):
+            if option.choices and value not in option.choices:
+                raise exceptions.ArgumentError(f'{label} must be one of {", ".join(f"`{choice}`" for choice in option.choices)}.')
+            if option.maximum is not None and len(value) > option.maximum:
+                raise exceptions.ArgumentError(f'{label} must be `{option.maximum}` characters or less.')
+            continue
+
+        if option.minimum is not None and (value < option.minimum or value > option.maximum):
+            raise exceptions.ArgumentError(f'{label} must be between `{option.minimum}` and `{option.maximum}`.')
+
+
+async def parse_pipeline(ctx: context.Context, pipeline: str) -> list[tuple[str, dict[str, Any]]]:
+
+    steps = []
+
+    for step in pipeline.split('|'):
+
+        if not (arguments := step.split()):
+            raise exceptions.ArgumentError('Pipeline steps can not be empty.')
+
+        name = arguments.pop(0).lower()
+        edit_type = OPERATION_ALIASES.get(name, name)
+
+        if (options := OPERATION_OPTIONS.get(edit_type)) is None:
+            raise exceptions.ArgumentError(f'`{name}` is not an image operation.')
+
+        values = {}
+        positional = iter(options)
+
+        for argument in arguments:
+
+            if '=' in argument:
+                key, argument = argument.split('=', 1)
+            elif (key := next(positional, None)) is None:
+                raise exceptions.ArgumentError(f'`{name}` was given too many options.')
+
+            if (option := options.get(key)) is None:
+                raise exceptions.ArgumentError(f'`{key}` is not an option of `{name}`.')
+
+            try:
+                if option.converter is commands.ColourConverter:
+                    values[key] = str(await commands.ColourConverter().convert(ctx, argument))
+                else:
+                    values[key] = option.converter(argument)
+            except (ValueError, commands.BadArgument):
+                raise exceptions.ArgumentError(f'`{argument}` is not a valid value for `{key}` of `{name}`.')
+
+        for key, option in options.items():
+            if key not in values:
+                values[key] = _random_colour() if option.converter is commands.ColourConverter else option.default
+
+        validate_options(edit_type, **values)
+        steps.append((edit_type, values))
+
+    return steps
+
+
 class Images(commands.Cog):
 
     def __init__(self, bot: Life) -> None:
@@ -55,10 +193,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('adaptive_blur', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='adaptive_blur', radius=radius, sigma=sigma)
@@ -77,10 +212,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 50:
-            raise exceptions.ArgumentError('Radius must be between `0` and `50`.')
-        if sigma < 0 or sigma > 50:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `50`.')
+        validate_options('adaptive_sharpen', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='adaptive_sharpen', radius=radius, sigma=sigma)
@@ -96,8 +228,7 @@ class Images(commands.Cog):
         `factor`: The factor to shift blue colours by.
         """
 
-        if factor < 0 or factor > 20:
-            raise exceptions.ArgumentError('Factor must be between `0` and `20`.')
+        validate_options('blueshift', factor=factor)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='blueshift', factor=factor)
@@ -116,10 +247,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('blur', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='blur', radius=radius, sigma=sigma)
@@ -138,7 +266,7 @@ class Images(commands.Cog):
         """
 
         if not colour:
-            colour = '#%02X%02X%02X' % (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+            colour = _random_colour()
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='border', colour=str(colour), width=width, height=height)
@@ -157,10 +285,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('edge', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='edge', radius=radius, sigma=sigma)
@@ -179,10 +304,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < -10 or radius > 10:
-            raise exceptions.ArgumentError('Radius must be between `-10.0` and `10.0`.')
-        if sigma < -5 or sigma > 5:
-            raise exceptions.ArgumentError('Sigma must be between `-5.0` and `5.0`.')
+        validate_options('charcoal', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='charcoal', radius=radius, sigma=sigma)
@@ -199,7 +321,7 @@ class Images(commands.Cog):
         """
 
         if not colour:
-            colour = '#%02X%02X%02X' % (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+            colour = _random_colour()
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='colorize', colour=str(colour))
@@ -244,10 +366,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('emboss', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='emboss', radius=radius, sigma=sigma)
@@ -309,7 +428,7 @@ class Images(commands.Cog):
         """
 
         if not colour:
-            colour = '#%02X%02X%02X' % (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+            colour = _random_colour()
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='frame', matte=str(colour), height=height, width=width, inner_bevel=inner, outer_bevel=outer)
@@ -328,10 +447,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('gaussian_blur', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='gaussian_blur', radius=radius, sigma=sigma)
@@ -347,8 +463,7 @@ class Images(commands.Cog):
         `amount`: The factor to push or pull pixels by, negative values will push, positives will pull. For the best results use -1.0 to 1.0.
         """
 
-        if amount < -20 or amount > 20:
-            raise exceptions.ArgumentError('Amount must be between `-20` and `20`.')
+        validate_options('implode', amount=amount)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='implode', amount=amount)
@@ -364,8 +479,7 @@ class Images(commands.Cog):
         `colours`: The amount of colours to keep in the image.
         """
 
-        if colours > 1024:
-            raise exceptions.ArgumentError('Number of colours must be less than 1024.')
+        validate_options('kmeans', number_colours=colours)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='kmeans', number_colours=colours)
@@ -384,10 +498,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 20:
-            raise exceptions.ArgumentError('Radius must be between `0` and `20`.')
-        if sigma < 0 or sigma > 20:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `20`.')
+        validate_options('kuwahara', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='kuwahara', radius=radius, sigma=sigma)
@@ -407,10 +518,7 @@ class Images(commands.Cog):
         `angle`: The angle at which to apply the blur.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('motion_blur', radius=radius, sigma=sigma, angle=angle)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='motion_blur', radius=radius, sigma=sigma, angle=angle)
@@ -443,8 +551,7 @@ class Images(commands.Cog):
         Methods: `uniform`, `gaussian`, `multiplicative_gaussian`, `impulse`, `laplacian`, `poisson`, `random`.
         """
 
-        if attenuate < 0 or attenuate > 1:
-            raise exceptions.ArgumentError('Attenuate must be between `0.0` and `1.0`.')
+        validate_options('noise', method=method, attenuate=attenuate)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='noise', method=method, attenuate=attenuate)
@@ -463,10 +570,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 30:
-            raise exceptions.ArgumentError('Radius must be between `0` and `30`.')
-        if sigma < 0 or sigma > 30:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `30`.')
+        validate_options('oil_paint', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='oil_paint', radius=radius, sigma=sigma)
@@ -483,10 +587,7 @@ class Images(commands.Cog):
         `caption`: A caption that will appear on the polaroid.
         """
 
-        if angle < -360 or angle > 360:
-            raise exceptions.ArgumentError('Angle must be between `-360` and `360`.')
-        if caption and len(caption) > 100:
-            raise exceptions.ArgumentError('Caption must be `100` characters or less.')
+        validate_options('polaroid', angle=angle, caption=caption)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='polaroid', angle=angle, caption=caption)
@@ -502,8 +603,7 @@ class Images(commands.Cog):
         `degree`: The amount of degrees to rotate the image.
         """
 
-        if degree < -360 or degree > 360:
-            raise exceptions.ArgumentError('Degree must be between `-360` and `360`.')
+        validate_options('rotate', degree=degree)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='rotate', degree=degree)
@@ -519,8 +619,7 @@ class Images(commands.Cog):
         `threshold`: The factor to tone the image by.
         """
 
-        if threshold < 0 or threshold > 1:
-            raise exceptions.ArgumentError('Threshold must be between `0.0` and `1.0`.')
+        validate_options('sepia_tone', threshold=threshold)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='sepia_tone', threshold=threshold)
@@ -539,10 +638,7 @@ class Images(commands.Cog):
         `sigma`: Standard deviation of the gaussian filter.
         """
 
-        if radius < 0 or radius > 50:
-            raise exceptions.ArgumentError('Radius must be between `0` and `50`.')
-        if sigma < 0 or sigma > 50:
-            raise exceptions.ArgumentError('Sigma must be between `0` and `50`.')
+        validate_options('sharpen', radius=radius, sigma=sigma)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='sharpen', radius=radius, sigma=sigma)
@@ -558,8 +654,7 @@ class Images(commands.Cog):
         `threshold`: Threshold to select pixels with.
         """
 
-        if threshold < 0 or threshold > 1:
-            raise exceptions.ArgumentError('Threshold must be between `0.0` and `1.0`.')
+        validate_options('solarize', threshold=threshold)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='solarize', threshold=threshold)
@@ -575,8 +670,7 @@ class Images(commands.Cog):
         `radius`: The area in which to search around a pixel to replace it with.
         """
 
-        if radius < 0 or radius > 50:
-            raise exceptions.ArgumentError('Radius must be between `0` and `50`.')
+        validate_options('spread', radius=radius)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='spread', radius=radius)
@@ -592,8 +686,7 @@ class Images(commands.Cog):
         `degree`: The degree to swirl the pixels by, negative numbers will go clockwise and positives counter-clockwise.
         """
 
-        if degree < -360 or degree > 360:
-            raise exceptions.ArgumentError('Degree must be between `-360` and `360`.')
+        validate_options('swirl', degree=degree)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='swirl', degree=degree)
@@ -609,8 +702,7 @@ class Images(commands.Cog):
         `degree`: The degree to swirl the pixels by, negative numbers will go clockwise and positives counter-clockwise.
         """
 
-        if transparency < 0.0 or transparency > 1.0:
-            raise exceptions.ArgumentError('Transparency must be between `0.0` and `1.0`.')
+        validate_options('transparentize', transparency=transparency)
 
         async with ctx.channel.typing():
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='transparentize', transparency=transparency)
@@ -668,6 +760,24 @@ class Images(commands.Cog):
             embed = await imaging.edit_image(ctx=ctx, url=str(image), edit_type='cube')
             await ctx.reply(embed=embed)
 
+    @commands.max_concurrency(1, per=commands.cooldowns.BucketType.member)
+    @commands.command(name='pipeline', aliases=['chain'])
+    async def pipeline(self, ctx: context.Context, image: Optional[converters.ImageConverter], *, steps: str) -> None:
+        """
+        Applies several image operations one after another.
+
+        `image`: Can be a members ID, Username, Nickname or @Mention, attachment, emoji or an image url.
+        `steps`: Operations separated by `|`, each followed by its options in order or as `name=value`.
+
+        Example: `pipeline @Axel blur 0 5 | swirl degree=90 | sepia_tone`
+        """
+
+        steps = await parse_pipeline(ctx, steps)
+
+        async with ctx.channel.typing():
+            embed = await imaging.edit_image_pipeline(ctx=ctx, url=str(image), steps=steps)
+            await ctx.reply(embed=embed)
+
 
 def setup(bot: Life) -> None:
     bot.add_cog(Images(bot=bot))
@@ -16,7 +16,7 @@ from discord.ext import commands
 
 import config
 from bot import Life
-from utilities import context, converters, exceptions, utils
+from utilities import context, converters, exceptions, paginators, timezones, utils
 
 
 class Time(commands.Cog):
@@ -27,22 +27,21 @@ class Time(commands.Cog):
     @commands.command(name='times')
     async def times(self, ctx: context.Context) -> None:
 
-        configs = sorted(self.bot.user_manager.configs.items(), key=lambda kv: kv[1].time.offset_hours)
-        timezone_users = {}
+        await self.bot.user_manager.prefetch_members(ctx.guild)
 
-        for user_id, user_config in configs:
+        timezone_users = {}
 
-            member = ctx.guild.get_member(user_id)
-            if not member:
-                continue
+        # Grouped through the registry's zone index, so the time and offset are only worked out once per zone rather than once per user.
+        for name, user_ids in timezones.registry.group((member.id for member in ctx.guild.members), exclude={'UTC'}):
 
-            if user_config.timezone_private or user_config.timezone == pendulum.timezone('UTC'):
+            members = [
+                f'{ctx.guild.get_member(user_id)} - {name}' for user_id in user_ids
+                if (user_config := self.bot.user_manager.configs.get(user_id)) is not None and not user_config.timezone_private
+            ]
+            if not members:
                 continue
 
-            if timezone_users.get(user_config.time.format('HH:mm (ZZ)')) is None:
-                timezone_users[user_config.time.format('HH:mm (ZZ)')] = [f'{member} - {user_config.timezone.name}']
-            else:
-                timezone_users[user_config.time.format('HH:mm (ZZ)')].append(f'{member} - {user_config.timezone.name}')
+            timezone_users.setdefault(timezones.registry.now(name).format('HH:mm (ZZ)'), []).extend(members)
 
         if not timezone_users:
             raise exceptions.ArgumentError('There are no users with timezones set.')
@@ -82,7 +81,7 @@ class Time(commands.Cog):
             except exceptions.ArgumentError as error:
                 try:
                     member = await commands.MemberConverter().convert(ctx=ctx, argument=timezone)
-                    user_config = self.bot.user_manager.get_config(member.id)
+                    user_config = await self.bot.user_manager.fetch_config(member.id)
                     if user_config.timezone_private is True and member.id != ctx.author.id:
                         raise exceptions.ArgumentError('That users timezone is private.')
                     timezone = user_config.timezone
@@ -217,18 +216,34 @@ class Time(commands.Cog):
         Display a list of all your reminders.
         """
 
-        if not ctx.user_config.reminders:
-            raise exceptions.ArgumentError('You do not have any reminders.')
+        # Active reminders come first, then finished ones (most recent first) which are only read from the database as pages of them are needed.
+        active = sorted(ctx.user_config.reminders.values(), key=lambda reminder: reminder.datetime)
+        last = None
 
-        entries = [
-            f'`{reminder.id}:` **{"In " if reminder.done is False else ""}{utils.format_difference(datetime=reminder.datetime, suppress=[])}{" ago" if reminder.done else ""}**\n'
-            f'`When:` {utils.format_datetime(datetime=reminder.datetime, seconds=True)}\n'
-            f'`Content:` {await utils.safe_text(mystbin_client=self.bot.mystbin, text=reminder.content, max_characters=100)}\n'
-            f'`Done:` {reminder.done}\n'
-            for reminder in sorted(ctx.user_config.reminders.values(), key=lambda reminder: reminder.datetime)
-        ]
+        async def fetch(page: int) -> list[str]:
+            nonlocal last
+
+            reminders = active[page * 5:page * 5 + 5]
+
+            if len(reminders) < 5:
+                archived = await self.bot.reminder_manager.fetch_archive(ctx.author.id, before=last, limit=5 - len(reminders))
+                last = archived[-1] if archived else last
+                reminders.extend(archived)
+
+            return [
+                f'`{reminder.id}:` **{"In " if reminder.done is False else ""}{utils.format_difference(datetime=reminder.datetime, suppress=[])}{" ago" if reminder.done else ""}**\n'
+                f'`When:` {utils.format_datetime(datetime=reminder.datetime, seconds=True)}\n'
+                f'`Content:` {await utils.safe_text(mystbin_client=self.bot.mystbin, text=reminder.content, max_characters=100)}\n'
+                f'`Done:` {reminder.done}\n'
+                for reminder in reminders
+            ]
+
+        paginator = paginators.LazyEmbedPaginator(ctx=ctx, fetch=fetch, per_page=5, header=f'**All reminders for** `{ctx.author}:`\n\n')
+
+        if not await paginator.fetch_page(0):
+            raise exceptions.ArgumentError('You do not have any reminders.')
 
-        await ctx.paginate_embed(entries=entries, per_page=5, header=f'**All reminders for** `{ctx.author}:`\n\n')
+        await paginator.paginate()
 
     @reminders.command(name='delete')
     async def reminders_delete(self, ctx: context.Context, *, reminder_ids: str) -> None:
@@ -249,7 +264,7 @@ class Time(commands.Cog):
 
             if reminder_id in reminder_ids_to_remove:
                 raise exceptions.ArgumentError(f'You provided the id `{reminder_id}` more than once.')
-            if reminder_id not in ctx.user_config.reminders.keys():
+            if not await self.bot.reminder_manager.get_reminder(ctx.author.id, reminder_id=reminder_id):
                 raise exceptions.ArgumentError(f'You do not have a reminder with the id `{reminder_id}`.')
 
             reminder_ids_to_remove.append(reminder_id)
@@ -62,6 +62,44 @@ NODES = [
 ]
 
 
+# Imaging settings
+IMAGE_WORKERS = 4  # Number of long-lived image worker processes, 0 uses the amount of CPU cores.
+IMAGE_TIMEOUT = 60  # Seconds a single image edit may take before its worker is killed and replaced.
+IMAGE_GUILD_LIMIT = 2  # Most image workers that jobs from one guild may use at the same time, big gifs are split across this many.
+IMAGE_QUEUE_NOTICE = 5  # Seconds an image job may wait in the queue before the user is told their position in it.
+
+
+# User settings
+USER_FLUSH_INTERVAL = 60  # Seconds between writes of changed user configs (xp, coins) to the database.
+USER_FLUSH_BATCH_SIZE = 5000  # Most users written by a single UPDATE during a flush.
+USER_CONFIG_CACHE = {
+    'lazy':     False,  # Fetch user configs from the database when they are first needed instead of loading every one at startup.
+    'max_size': 50000,  # Most user configs kept in memory in lazy mode, configs with unsaved changes, reminders or todos are never evicted.
+    'max_idle': 3600,  # Seconds an unused user config stays in memory in lazy mode.
+    'prefetch': 1000,  # Amount of the most active users loaded at startup in lazy mode.
+}
+USER_INSERTS = {
+    'interval':     1,  # Seconds between batched inserts of users that were created in memory (e.g. by their first message).
+    'batch_size':   1000,  # Most users inserted by a single statement.
+    'max_queued':   10000,  # Most users waiting to be inserted, anything creating more waits for the queue to drain.
+    'wait_timeout': 30,  # Seconds a command waits for its user to be inserted before failing, the insert itself keeps being retried.
+}
+REMINDER_HORIZON = 3600  # Seconds ahead that reminders are loaded from the database and scheduled in memory.
+REMINDER_DELIVERY = {
+    'batch_size':  100,  # Most reminders that are sent and then acknowledged in the database together.
+    'concurrency': 10,  # Most reminders being sent at the same time.
+}
+REMINDER_RECOVERY = {
+    'batch_size': 25,  # Users sent their overdue reminders together when catching up after downtime, each user gets one message.
+    'interval':   1,  # Seconds to wait between those batches.
+}
+GUILD_RANKS_IDLE = 1800  # Seconds a guild's leaderboard stays in memory after it was last used.
+XP_COOLDOWN = {
+    'seconds':      60,  # Seconds after gaining xp from a message before a user can gain xp again.
+    'redis_mirror': False,  # Also claim cooldowns in redis so that they are shared between shards running as separate processes.
+}
+
+
 # Webhook URL's
 ERROR_WEBHOOK_URL = ''
 LOGGING_WEBHOOK_URL = ''
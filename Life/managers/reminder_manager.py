@@ -12,14 +12,19 @@
 
 from __future__ import annotations
 
+import asyncio
+import collections
 import logging
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING, Union
 
-import aioscheduler
+import asyncpg
 import discord
+import pendulum
+from discord.ext import tasks
 from pendulum.datetime import DateTime
 
-from utilities import enums, exceptions, objects, utils
+import config
+from utilities import enums, exceptions, objects, timers, utils
 
 if TYPE_CHECKING:
     from bot import Life
@@ -32,58 +37,324 @@ class ReminderManager:
     def __init__(self, bot: Life) -> None:
         self.bot = bot
 
-        self.scheduler = aioscheduler.Manager(2)
-
-        self.REPEAT_TYPE_TIMES = {
-            1: lambda dt: dt.add(minutes=30),
-            2: lambda dt: dt.add(hours=1),
-            3: lambda dt: dt.add(hours=2),
-
-            4: lambda dt: dt.add(hours=12),
-            5: lambda dt: dt.add(days=1),
-            6: lambda dt: dt.add(days=2),
+        # Only reminders due before `window_end` (which is kept about one horizon ahead) are in the wheel, the rest wait in the database until the
+        # window reaches them.
+        self.wheel: timers.TimerWheel = timers.TimerWheel(horizon=config.REMINDER_HORIZON * 2)
+        self.scheduled: dict[int, objects.Reminder] = {}
+        self.window_end: DateTime = pendulum.now(tz='UTC')
+
+        # Caps how many reminders are being sent at once, discord.py handles the per route rate limits and this keeps it from queueing too many.
+        self.delivery_semaphore: asyncio.Semaphore = asyncio.Semaphore(config.REMINDER_DELIVERY['concurrency'])
+        self.delivered: int = 0
+        self.recovered: int = 0
+        self.lags: collections.deque[float] = collections.deque(maxlen=1000)
+
+        # How far each repeat type moves a reminder along, as a pendulum unit and an amount of it.
+        self.REPEAT_TYPE_STEPS = {
+            1: ('minutes', 30),
+            2: ('hours', 1),
+            3: ('hours', 2),
+
+            4: ('hours', 12),
+            5: ('days', 1),
+            6: ('days', 2),
+
+            7: ('days', 7),
+            8: ('days', 14),
+
+            9: ('weeks', 2),
+            10: ('months', 1),
+            11: ('months', 2),
+
+            12: ('months', 6),
+            13: ('years', 1),
+            14: ('years', 2)
+        }
 
-            7: lambda dt: dt.add(days=7),
-            8: lambda dt: dt.add(days=14),
+    async def load(self) -> None:
 
-            9: lambda dt: dt.add(weeks=2),
-            10: lambda dt: dt.add(months=1),
-            11: lambda dt: dt.add(months=2),
+        await self.bot.db.execute('CREATE INDEX IF NOT EXISTS reminders_pending_datetime_idx ON reminders (datetime) WHERE notified = false')
+        await self.bot.db.execute('CREATE INDEX IF NOT EXISTS reminders_user_archive_idx ON reminders (user_id, datetime DESC, id DESC) WHERE notified = true')
 
-            12: lambda dt: dt.add(months=6),
-            13: lambda dt: dt.add(years=1),
-            14: lambda dt: dt.add(years=2)
-        }
+        await self.bot.db.execute('ALTER TABLE reminders ADD COLUMN IF NOT EXISTS occurrences integer NOT NULL DEFAULT 0')
 
-    async def load(self) -> None:
+        # Only reminders that are yet to be sent live on user configs, finished ones are read from the database when someone asks for them.
+        reminders = await self.bot.db.fetch('SELECT * FROM reminders WHERE notified = false ORDER BY datetime')
+        await self.bot.user_manager.prefetch(reminder_data['user_id'] for reminder_data in reminders)
 
-        self.scheduler.start()
+        # Everything due up to now is left to the recovery pass and everything after it to the wheel, so nothing is delivered by both.
+        now = pendulum.now(tz='UTC')
+        overdue = []
 
-        reminders = await self.bot.db.fetch('SELECT * FROM reminders order by datetime')
         for reminder_data in reminders:
 
             reminder = objects.Reminder(data=reminder_data)
-            if not reminder.done:
-                await self.schedule_reminder(reminder)
 
             user_config = await self.bot.user_manager.get_or_create_config(reminder.user_id)
             user_config.reminders[reminder.id] = reminder
 
-        __log__.info(f'[REMINDER MANAGER] Loaded reminders. [{len(reminders)} reminders]')
-        print(f'[REMINDER MANAGER] Loaded reminders. [{len(reminders)} reminders]')
+            if reminder.datetime <= now:
+                overdue.append(reminder)
 
-    #
+        self.window_end = now
+        await self.page()
+        self.tick.start()
+
+        if overdue:
+            self.bot.loop.create_task(self.recover(overdue))
+
+        __log__.info(f'[REMINDER MANAGER] Loaded reminders. [{len(reminders)} reminders] [{len(self.scheduled)} scheduled] [{len(overdue)} overdue]')
+        print(f'[REMINDER MANAGER] Loaded reminders. [{len(reminders)} reminders] [{len(self.scheduled)} scheduled] [{len(overdue)} overdue]')
+
+    # Scheduling
+
+    @tasks.loop(seconds=1)
+    async def tick(self) -> None:
+
+        due = [reminder for reminder_id in self.wheel.pop_due() if (reminder := self.scheduled.pop(reminder_id, None)) is not None]
+
+        # Everything that came due in the same second is delivered as one batch.
+        for index in range(0, len(due), config.REMINDER_DELIVERY['batch_size']):
+            self.bot.loop.create_task(self.deliver(due[index:index + config.REMINDER_DELIVERY['batch_size']]))
+
+        # The window is extended to a full horizon ahead once less than half of it is left, so the database is read about twice per horizon.
+        if self.window_end.subtract(seconds=config.REMINDER_HORIZON / 2) > pendulum.now(tz='UTC'):
+            return
+
+        try:
+            await self.page()
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as error:
+            # A failed page leaves the window where it was, so the next tick tries again rather than the loop stopping.
+            __log__.error(f'[REMINDER MANAGER] Failed to page in reminders, retrying on the next tick. {error!r}')
+
+    async def page(self) -> None:
+        """
+        Moves the window forward to one horizon from now, scheduling the reminders that fall in the part it was moved over.
+        """
+
+        start, end = self.window_end, pendulum.now(tz='UTC').add(seconds=config.REMINDER_HORIZON)
+
+        # Moved before the fetch so that reminders created or repeated while it is in flight are scheduled directly rather than missed. Any that
+        # the fetch returns as well just replace themselves, as both the wheel and `scheduled` are keyed by id.
+        self.window_end = end
+
+        try:
+            records = await self.bot.db.fetch(
+                    'SELECT * FROM reminders WHERE notified = false AND datetime > $1 AND datetime <= $2 ORDER BY datetime', start.naive(), end.naive()
+            )
+        except BaseException:
+            # Nothing in the new part of the window was fetched, so it is handed back to be paged in again next time.
+            self.window_end = start
+            raise
+
+        for record in records:
+
+            # The same object as the one on the user's config, if it is loaded, so that edits made through either are seen by both.
+            user_config = self.bot.user_manager.configs.get(record['user_id'])
+            reminder = user_config.reminders.get(record['id']) if user_config else None
 
-    async def schedule_reminder(self, reminder: objects.Reminder) -> None:
+            self.schedule_reminder(reminder or objects.Reminder(data=record))
 
-        reminder.task = self.scheduler.schedule(self.do_reminder(reminder), when=reminder.datetime.naive())
+        if records:
+            __log__.debug(f'[REMINDER MANAGER] Paged in {len(records)} reminders due before \'{end}\'.')
+
+    def schedule_reminder(self, reminder: objects.Reminder) -> None:
+
+        if reminder.datetime > self.window_end:
+            return
+
+        if not self.wheel.add(reminder.id, reminder.datetime.timestamp()):
+            self.scheduled.pop(reminder.id, None)
+            __log__.error(f'[REMINDER MANAGER] Reminder with id \'{reminder.id}\' for \'{reminder.datetime}\' is beyond the timer wheel, it was not scheduled.')
+            return
+
+        self.scheduled[reminder.id] = reminder
         __log__.info(f'[REMINDER MANAGER] Scheduled reminder with id \'{reminder.id}\' for \'{reminder.datetime}\'')
 
-    async def do_reminder(self, reminder: objects.Reminder) -> None:
+    def unschedule_reminder(self, reminder: objects.Reminder) -> None:
+
+        self.scheduled.pop(reminder.id, None)
+        self.wheel.discard(reminder.id)
+
+    def reschedule_reminder(self, reminder: objects.Reminder, *, datetime: DateTime) -> None:
+
+        self.unschedule_reminder(reminder)
+        reminder.datetime = datetime
+        self.schedule_reminder(reminder)
+
+    def next_occurrence(self, reminder: objects.Reminder, *, after: DateTime) -> tuple[DateTime, int]:
+        """
+        Returns the first time after `after` that a repeating reminder comes due, and how many steps of its repeat type that is from its current time.
+        """
+
+        unit, amount = self.REPEAT_TYPE_STEPS[reminder.repeat_type.value]
+
+        # The number of steps is guessed from the length of the first one, months and years are not all the same length so it can be a step or so off.
+        length = (reminder.datetime.add(**{unit: amount}) - reminder.datetime).total_seconds()
+        steps = max(int((after - reminder.datetime).total_seconds() // length) + 1, 1)
+
+        while reminder.datetime.add(**{unit: amount * steps}) <= after:
+            steps += 1
+        while steps > 1 and reminder.datetime.add(**{unit: amount * (steps - 1)}) > after:
+            steps -= 1
+
+        return reminder.datetime.add(**{unit: amount * steps}), steps
+
+    @staticmethod
+    async def advance_repeats(db: Union[asyncpg.Pool, asyncpg.Connection], advances: dict[int, tuple[DateTime, int]]) -> set[int]:
+        """
+        Moves repeating reminders to their next time and counts the occurrences they went past, returns the ids of the reminders that still exist.
+        """
+
+        records = await db.fetch(
+                'UPDATE reminders SET datetime = new.datetime, occurrences = reminders.occurrences + new.steps '
+                'FROM unnest($1::bigint[], $2::timestamp[], $3::integer[]) AS new (id, datetime, steps) WHERE reminders.id = new.id RETURNING reminders.id',
+                list(advances.keys()), [datetime.naive() for datetime, _ in advances.values()], [steps for _, steps in advances.values()]
+        )
+
+        return {record['id'] for record in records}
+
+    async def _prefetch(self, user_ids: list[int]) -> None:
+
+        # Only saves the sends fetching configs one at a time, so failing here must not keep a batch from being sent and acknowledged.
+        try:
+            await self.bot.user_manager.prefetch(user_ids)
+        except Exception as error:
+            __log__.warning(f'[REMINDER MANAGER] Failed to prefetch {len(user_ids)} user configs for delivery. {error!r}')
+
+    async def deliver(self, reminders: list[objects.Reminder]) -> None:
+
+        await self._prefetch([reminder.user_id for reminder in reminders])
+
+        # One reminder failing in a way send_reminder doesn't expect is logged, the rest of the batch is still sent and everything is acknowledged
+        # so that nothing is sent again after a restart.
+        results = await asyncio.gather(*(self.send_reminder(reminder) for reminder in reminders), return_exceptions=True)
+        for reminder, result in zip(reminders, results):
+            if isinstance(result, BaseException):
+                __log__.error(f'[REMINDER MANAGER] Failed to send reminder with id \'{reminder.id}\'. {result!r}')
+
+        await self.acknowledge(reminders)
+
+    async def acknowledge(self, reminders: list[objects.Reminder]) -> None:
+        """
+        Marks sent reminders as notified, or moves them to their next time if they repeat, with one transaction for the whole batch.
+        """
+
+        # Repeating reminders keep their row and are moved to their next time, rather than a new reminder being created for every occurrence.
+        now = pendulum.now(tz='UTC')
+        advances = {reminder.id: self.next_occurrence(reminder, after=now) for reminder in reminders if reminder.repeat_type != enums.ReminderRepeatType.NEVER}
+
+        try:
+            async with self.bot.db.acquire() as db, db.transaction():
+
+                if finished := [reminder.id for reminder in reminders if reminder.id not in advances]:
+                    await db.execute('UPDATE reminders SET notified = true WHERE id = ANY($1::bigint[])', finished)
+
+                advanced = await self.advance_repeats(db, advances) if advances else set()
+
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as error:
+            __log__.error(f'[REMINDER MANAGER] Failed to acknowledge {len(reminders)} delivered reminders. {error!r}')
+            return
+
+        for reminder in reminders:
+
+            if reminder.id in advances:
+
+                # Reminders deleted while they were being sent are not advanced, so they are not scheduled again either.
+                if reminder.id in advanced:
+                    datetime, steps = advances[reminder.id]
+                    reminder.occurrences += steps
+                    self.reschedule_reminder(reminder, datetime=datetime)
+
+                continue
+
+            reminder.notified = True
+
+            if (user_config := self.bot.user_manager.configs.get(reminder.user_id)) is not None:
+                user_config.reminders.pop(reminder.id, None)
+
+    async def recover(self, reminders: list[objects.Reminder]) -> None:
+        """
+        Delivers reminders that came due while the bot was offline. Each user gets one message listing all of theirs, and users are worked through in
+        batches with a pause between each, so that a long outage doesn't turn into a burst of sends at startup.
+        """
+
+        by_user: dict[int, list[objects.Reminder]] = {}
+        for reminder in sorted(reminders, key=lambda reminder: reminder.datetime):
+            by_user.setdefault(reminder.user_id, []).append(reminder)
+
+        user_ids = list(by_user.keys())
+        batch_size = config.REMINDER_RECOVERY['batch_size']
+
+        __log__.info(f'[REMINDER MANAGER] Recovering {len(reminders)} overdue reminders for {len(user_ids)} users.')
+
+        for index in range(0, len(user_ids), batch_size):
+
+            batch = user_ids[index:index + batch_size]
+
+            await self._prefetch(batch)
+
+            results = await asyncio.gather(*(self.send_overdue_reminders(by_user[user_id]) for user_id in batch), return_exceptions=True)
+            for user_id, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    __log__.error(f'[REMINDER MANAGER] Failed to send overdue reminders for user with id \'{user_id}\'. {result!r}')
+            await self.acknowledge([reminder for user_id in batch for reminder in by_user[user_id]])
+
+            if index + batch_size < len(user_ids):
+                await asyncio.sleep(config.REMINDER_RECOVERY['interval'])
+
+        __log__.info(f'[REMINDER MANAGER] Recovered {len(reminders)} overdue reminders.')
+
+    async def send_overdue_reminders(self, reminders: list[objects.Reminder]) -> None:
+
+        user = self.bot.get_user(reminders[0].user_id)
+        user_config = await self.bot.user_manager.fetch_config(reminders[0].user_id)
+
+        # Reminders from a single channel are sent there, otherwise they go to the user's dms, each falling back to the other.
+        channels = {reminder.channel_id for reminder in reminders}
+        channel = self.bot.get_channel(channels.pop()) if len(channels) == 1 else None
+        destinations = [destination for destination in (channel, user, self.bot.get_channel(reminders[-1].channel_id)) if destination is not None]
+
+        entries = [
+            f'`{reminder.id}:` Due `{utils.format_difference(datetime=reminder.datetime, suppress=[])}` ago, **[Jump to message]({reminder.jump_url})**\n'
+            f'{await utils.safe_text(mystbin_client=self.bot.mystbin, text=reminder.content, max_characters=200)}\n'
+            for reminder in reminders
+        ]
+
+        # Split over as few messages as the embed description limit allows.
+        header = f'**{len(reminders)} reminder{"s" if len(reminders) > 1 else ""} came due while I was offline:**\n\n'
+        descriptions = [header]
+        for entry in entries:
+            if len(descriptions[-1]) + len(entry) > 2000:
+                descriptions.append('')
+            descriptions[-1] += f'{entry}\n'
+
+        for description in descriptions:
+
+            embed = discord.Embed(colour=user_config.colour, description=description)
+
+            async with self.delivery_semaphore:
+
+                for destination in destinations:
+                    try:
+                        await destination.send(embed=embed)
+                        break
+                    except discord.Forbidden:
+                        continue
+                    except discord.HTTPException as error:
+                        __log__.warning(f'[REMINDER MANAGER] Failed to send overdue reminders for user with id \'{reminders[0].user_id}\'. {error!r}')
+                        break
+                else:
+                    __log__.warning(f'[REMINDER MANAGER] Attempted overdue reminders for user with id \'{reminders[0].user_id}\' but channel or user did not exist.')
+                    return
+
+        self.recovered += len(reminders)
+
+    async def send_reminder(self, reminder: objects.Reminder) -> None:
 
         user = self.bot.get_user(reminder.user_id)
         channel = self.bot.get_channel(reminder.channel_id)
-        user_config = self.bot.user_manager.get_config(reminder.user_id)
+        user_config = await self.bot.user_manager.fetch_config(reminder.user_id)
 
         embed = discord.Embed(
                 colour=user_config.colour,
@@ -93,29 +364,63 @@ class ReminderManager:
                             f'**[Jump to message]({reminder.jump_url})**'
         )
 
-        try:
-            await channel.send(embed=embed)
-        except (discord.Forbidden, AttributeError):
-            try:
-                await user.send(embed=embed)
-            except (discord.Forbidden, AttributeError):
-                __log__.warning(f'[REMINDER MANAGER] Attempted reminder with id \'{reminder.id}\' but channel or user did not exist.')
+        async with self.delivery_semaphore:
 
-        await self.bot.db.execute('UPDATE reminders SET notified = true WHERE id = $1', reminder.id)
-        reminder.notified = True
+            self.lags.append((pendulum.now(tz='UTC') - reminder.datetime).total_seconds())
+            self.delivered += 1
 
-        if reminder.repeat_type != enums.ReminderRepeatType.NEVER:
-            await self.create_reminder(
-                    reminder.user_id, channel_id=reminder.channel_id, datetime= self.REPEAT_TYPE_TIMES[reminder.repeat_type](reminder.datetime), content=reminder.content,
-                    jump_url=reminder.jump_url, repeat_type=reminder.repeat_type
-            )
+            try:
+                await channel.send(embed=embed)
+            except (discord.Forbidden, AttributeError):
+                try:
+                    await user.send(embed=embed)
+                except (discord.Forbidden, AttributeError):
+                    __log__.warning(f'[REMINDER MANAGER] Attempted reminder with id \'{reminder.id}\' but channel or user did not exist.')
+                except discord.HTTPException as error:
+                    __log__.warning(f'[REMINDER MANAGER] Failed to send reminder with id \'{reminder.id}\'. {error!r}')
+            except discord.HTTPException as error:
+                __log__.warning(f'[REMINDER MANAGER] Failed to send reminder with id \'{reminder.id}\'. {error!r}')
+
+    @property
+    def metrics(self) -> dict[str, Union[int, float]]:
+
+        lags = sorted(self.lags)
+
+        return {
+            'scheduled':      len(self.scheduled),
+            'delivered':      self.delivered,
+            'recovered':      self.recovered,
+            'average_lag_ms': sum(lags) / len(lags) * 1000 if lags else 0,
+            'p95_lag_ms':     lags[int(len(lags) * 0.95)] * 1000 if lags else 0,
+            'max_lag_ms':     lags[-1] * 1000 if lags else 0,
+        }
 
     #
 
     async def get_reminder(self, user_id: int, *, reminder_id: int) -> Optional[objects.Reminder]:
 
         user_config = await self.bot.user_manager.get_or_create_config(user_id)
-        return user_config.reminders.get(reminder_id)
+
+        if (reminder := user_config.reminders.get(reminder_id)) is not None:
+            return reminder
+
+        # Finished reminders are not kept in memory.
+        data = await self.bot.db.fetchrow('SELECT * FROM reminders WHERE id = $1 AND user_id = $2', reminder_id, user_id)
+        return objects.Reminder(data=data) if data else None
+
+    async def fetch_archive(self, user_id: int, *, before: Optional[objects.Reminder] = None, limit: int = 10) -> list[objects.Reminder]:
+        """
+        Returns up to `limit` of the user's finished reminders, most recent first, starting after `before` (the last one of the previous page).
+        """
+
+        if before is None:
+            query = 'SELECT * FROM reminders WHERE user_id = $1 AND notified = true ORDER BY datetime DESC, id DESC LIMIT $2'
+            records = await self.bot.db.fetch(query, user_id, limit)
+        else:
+            query = 'SELECT * FROM reminders WHERE user_id = $1 AND notified = true AND (datetime, id) < ($3, $4) ORDER BY datetime DESC, id DESC LIMIT $2'
+            records = await self.bot.db.fetch(query, user_id, limit, before.datetime.naive(), before.id)
+
+        return [objects.Reminder(data=record) for record in records]
 
     async def create_reminder(
             self, user_id: int, *, channel_id: int, datetime: DateTime, content: str, jump_url: str = None, repeat_type: enums.ReminderRepeatType = enums.ReminderRepeatType.NEVER
@@ -130,7 +435,7 @@ class ReminderManager:
         user_config.reminders[reminder.id] = reminder
 
         if not reminder.done:
-            await self.schedule_reminder(reminder)
+            self.schedule_reminder(reminder)
 
         __log__.info(f'[REMINDER MANAGER] Created reminder with id \'{reminder.id}\'for user with id \'{reminder.user_id}\'.')
         return reminder
@@ -142,11 +447,10 @@ class ReminderManager:
         if not (reminder := await self.get_reminder(user_id, reminder_id=reminder_id)):
             raise exceptions.NotFound(f'You do not have a reminder with that id.')
 
-        if reminder.task:
-            self.scheduler.cancel(reminder.task)
+        self.unschedule_reminder(reminder)
 
         await self.bot.db.execute('DELETE FROM reminders WHERE id = $1', reminder.id)
-        del user_config.reminders[reminder_id]
+        user_config.reminders.pop(reminder_id, None)
 
     async def change_reminder_content(self, user_id: int, *, reminder_id: int, content: str, jump_url: str = None) -> None:
 
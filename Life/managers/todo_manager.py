@@ -31,6 +31,8 @@ class TodoManager:
     async def load(self) -> None:
 
         todos = await self.bot.db.fetch('SELECT * FROM todos')
+        await self.bot.user_manager.prefetch(todo_data['user_id'] for todo_data in todos)
+
         for todo_data in todos:
 
             todo = objects.Todo(data=todo_data)
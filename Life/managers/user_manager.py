@@ -12,14 +12,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import collections
 import io
 import logging
 import math
 import os
 import pathlib
 import random
-from typing import Literal, TYPE_CHECKING, Union
+import time
+from typing import Any, AsyncIterator, Iterable, Literal, Optional, TYPE_CHECKING, Union
 
+import asyncpg
 import discord
 import pendulum
 from PIL import Image, ImageDraw, ImageFont
@@ -27,13 +31,47 @@ from colorthief import ColorThief
 from discord.ext import tasks
 from pendulum import DateTime
 
-from utilities import enums, exceptions, objects, utils
+import config
+from utilities import cache, enums, exceptions, leaderboards, objects, timezones, utils
 
 if TYPE_CHECKING:
     from bot import Life
 
 __log__ = logging.getLogger(__name__)
 
+# Postgres array types used to send each write-behind column to an `UPDATE ... FROM unnest(...)`.
+COLUMN_TYPES = {
+    enums.Updateable.COINS:             'bigint',
+    enums.Updateable.XP:                'bigint',
+    enums.Updateable.DAILY_COLLECTED:   'timestamptz',
+    enums.Updateable.WEEKLY_COLLECTED:  'timestamptz',
+    enums.Updateable.MONTHLY_COLLECTED: 'timestamptz',
+    enums.Updateable.DAILY_STREAK:      'bigint',
+    enums.Updateable.WEEKLY_STREAK:     'bigint',
+    enums.Updateable.MONTHLY_STREAK:    'bigint',
+}
+
+# Each side of the join comes back as one composite column, which asyncpg decodes into a record of its own. That keeps users.id and notifications.id
+# apart without having to list every column, and a user without a notifications row simply gets None.
+CONFIGS_QUERY = 'SELECT users, notifications FROM users LEFT JOIN notifications ON notifications.user_id = users.id'
+# Most configs looked at by a single eviction pass.
+EVICT_SCAN = 1000
+
+
+def build_config(record: asyncpg.Record) -> objects.UserConfig:
+
+    user_config = objects.UserConfig(data=record['users'])
+    user_config.notifications = objects.Notifications(data=record['notifications'] or {})
+    return user_config
+
+
+async def stream_configs(connection: asyncpg.Connection, *, where: str = '', args: tuple = (), prefetch: int = 1000) -> AsyncIterator[objects.UserConfig]:
+
+    # A server side cursor only keeps `prefetch` rows in memory at a time, no matter how many users there are.
+    async with connection.transaction(readonly=True):
+        async for record in connection.cursor(f'{CONFIGS_QUERY} {where}', *args, prefetch=prefetch):
+            yield build_config(record)
+
 
 class UserManager:
 
@@ -41,9 +79,41 @@ class UserManager:
         self.bot = bot
 
         self.default_config = objects.DefaultUserConfig()
-        self.configs = {}
+        self.configs: collections.OrderedDict[int, objects.UserConfig] = collections.OrderedDict()
+
+        # Ids of configs with changes that are yet to be written to the database, and of those being written right now.
+        self.dirty: set[int] = set()
+        self.flushing: set[int] = set()
+
+        # In lazy mode configs are fetched the first time they are needed and kept in least recently used order, with the ones that have not
+        # been used for a while, or that don't fit, evicted unless they hold something that only lives in memory.
+        self.lazy: bool = config.USER_CONFIG_CACHE['lazy']
+        self.max_size: int = config.USER_CONFIG_CACHE['max_size']
+        self.max_idle: float = config.USER_CONFIG_CACHE['max_idle']
+
+        self.accessed: dict[int, float] = {}
+        self.fetching: dict[int, asyncio.Future] = {}
+        self.missing: cache.LRUCache = cache.LRUCache(max_size=self.max_size, ttl=self.max_idle)
+
+        # Every user ordered by xp (which is also the order by level) and by coins, so ranks and leaderboards don't have to sort the configs.
+        self.xp_index: leaderboards.RankIndex = leaderboards.RankIndex()
+        self.coins_index: leaderboards.RankIndex = leaderboards.RankIndex()
+
+        # Users that so far only exist in memory, mapped to when they were created and a future that is done once their rows have been inserted.
+        self.provisional: dict[int, tuple[float, asyncio.Future]] = {}
+        self.insert_queue: asyncio.Queue[int] = asyncio.Queue(maxsize=config.USER_INSERTS['max_queued'])
+        self.insert_retry: list[int] = []
+        self.insert_latencies: collections.deque[float] = collections.deque(maxlen=1000)
+
+        # The same, per guild, built from its members the first time it is used and kept up to date by member events until it goes unused.
+        self.guild_ranks: dict[int, leaderboards.GuildRanks] = {}
+        self.member_guilds: dict[int, set[int]] = {}
 
         self.update_database.start()
+        self.insert_configs.start()
+        self.evict_guild_ranks.start()
+        if self.lazy:
+            self.evict_configs.start()
 
         self.IMAGES = {
             'SAI': {
@@ -61,64 +131,368 @@ class UserManager:
 
     async def load(self) -> None:
 
-        configs = await self.bot.db.fetch('SELECT * FROM users')
-        notifications = await self.bot.db.fetch('SELECT * FROM notifications')
+        if self.lazy:
 
-        for config_data, notification_data in zip(configs, notifications):
-            user_config = objects.UserConfig(data=config_data)
-            user_config.notifications = objects.Notifications(data=notification_data)
-            self.configs[user_config.id] = user_config
+            # Only the columns the rank indexes need are loaded for everyone, full configs are left until they are used.
+            records = await self.bot.db.fetch('SELECT id, xp, coins FROM users')
+            self.xp_index = leaderboards.RankIndex((record['id'], record['xp']) for record in records)
+            self.coins_index = leaderboards.RankIndex((record['id'], record['coins']) for record in records)
+            del records
 
-        __log__.info(f'[USER MANAGER] Loaded user configs. [{len(configs)} users]')
-        print(f'[USER MANAGER] Loaded user configs. [{len(configs)} users]')
+            await self.prefetch(user_id for user_id, _ in self.xp_index.top(0, config.USER_CONFIG_CACHE['prefetch']))
+
+            __log__.info(f'[USER MANAGER] Prefetched user configs. [{len(self.configs)} users]')
+            print(f'[USER MANAGER] Prefetched user configs. [{len(self.configs)} users]')
+
+        else:
+
+            async with self.bot.db.acquire() as db:
+                async for user_config in stream_configs(db):
+                    self.configs[user_config.id] = user_config
+                    timezones.registry.add_user(user_config.id, user_config.timezone.name)
+
+            self.xp_index = leaderboards.RankIndex((user_id, user_config.xp) for user_id, user_config in self.configs.items())
+            self.coins_index = leaderboards.RankIndex((user_id, user_config.coins) for user_id, user_config in self.configs.items())
+
+            __log__.info(f'[USER MANAGER] Loaded user configs. [{len(self.configs)} users]')
+            print(f'[USER MANAGER] Loaded user configs. [{len(self.configs)} users]')
 
         await self.bot.reminder_manager.load()
         await self.bot.todo_manager.load()
 
     # Background tasks.
 
-    @tasks.loop(seconds=60)
+    @tasks.loop(seconds=config.USER_FLUSH_INTERVAL)
     async def update_database(self) -> None:
+        await self.flush()
 
-        if not self.configs:
+    @update_database.before_loop
+    async def before_update_database(self) -> None:
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=config.USER_INSERTS['interval'])
+    async def insert_configs(self) -> None:
+        await self.insert_provisional()
+
+    @tasks.loop(seconds=60)
+    async def evict_configs(self) -> None:
+        self._evict()
+
+    @tasks.loop(seconds=60)
+    async def evict_guild_ranks(self) -> None:
+
+        now = time.monotonic()
+
+        for guild_id, guild_ranks in list(self.guild_ranks.items()):
+            if now - guild_ranks.accessed >= config.GUILD_RANKS_IDLE:
+                self.drop_guild_ranks(guild_id)
+
+    async def flush(self) -> None:
+
+        if not self.dirty:
             return
 
-        need_updating = {user_id: user_config for user_id, user_config in self.configs.items() if len(user_config.requires_db_update) >= 1}
+        dirty, self.dirty = self.dirty, set()
+        groups: dict[tuple[enums.Updateable, ...], list[tuple[int, list]]] = collections.defaultdict(list)
 
-        async with self.bot.db.acquire(timeout=300) as db:
-            for user_id, user_config in need_updating.items():
+        # Values are captured now, anything that changes while the writes are in flight marks its user dirty again for the next flush.
+        for user_id in dirty:
 
-                query = ','.join(f'{editable.value} = ${index + 2}' for index, editable in enumerate(user_config.requires_db_update))
-                await db.execute(f'UPDATE users SET {query} WHERE id = $1', user_id, *[getattr(user_config, attribute.value) for attribute in user_config.requires_db_update])
+            # There is no row to update until the user has been inserted, so their changes wait for the next flush.
+            if user_id in self.provisional:
+                self.dirty.add(user_id)
+                continue
 
-                user_config.requires_db_update = set()
+            if (user_config := self.configs.get(user_id)) is None or not user_config.requires_db_update:
+                continue
 
-    @update_database.before_loop
-    async def before_update_database(self) -> None:
-        await self.bot.wait_until_ready()
+            columns = tuple(sorted(user_config.requires_db_update, key=lambda updateable: updateable.value))
+            groups[columns].append((user_id, [getattr(user_config, column.value) for column in columns]))
+            user_config.requires_db_update = set()
+
+        self.flushing.update(user_id for rows in groups.values() for user_id, _ in rows)
+
+        batches = [
+            (columns, rows[index:index + config.USER_FLUSH_BATCH_SIZE])
+            for columns, rows in groups.items() for index in range(0, len(rows), config.USER_FLUSH_BATCH_SIZE)
+        ]
+
+        written = 0
+
+        try:
+            async with self.bot.db.acquire(timeout=300) as db:
+                while batches:
+
+                    columns, rows = batches[0]
+                    query = ', '.join(f'{column.value} = data.{column.value}' for column in columns)
+                    arrays = ', '.join(f'${index + 2}::{COLUMN_TYPES[column]}[]' for index, column in enumerate(columns))
+                    names = ', '.join(column.value for column in columns)
+
+                    await db.execute(
+                            f'UPDATE users SET {query} FROM unnest($1::bigint[], {arrays}) AS data(id, {names}) WHERE users.id = data.id',
+                            [user_id for user_id, _ in rows], *(list(values) for values in zip(*(values for _, values in rows)))
+                    )
+
+                    batches.pop(0)
+                    written += len(rows)
+
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as error:
+            __log__.error(f'[USER MANAGER] Failed to flush user configs, {sum(len(rows) for _, rows in batches)} will be retried. {error!r}')
+            self._restore(batches)
+
+        except asyncio.CancelledError:
+            self._restore(batches)
+            raise
+
+        finally:
+            self.flushing.clear()
+
+        if written:
+            __log__.debug(f'[USER MANAGER] Flushed {written} user configs in {len(groups)} column groups.')
+
+    def _restore(self, batches: list[tuple[tuple[enums.Updateable, ...], list[tuple[int, list]]]]) -> None:
+
+        for columns, rows in batches:
+            for user_id, _ in rows:
+                if (user_config := self.configs.get(user_id)) is not None:
+                    user_config.requires_db_update.update(columns)
+                    self.dirty.add(user_id)
+
+    async def insert_provisional(self) -> None:
+
+        while self.insert_retry or not self.insert_queue.empty():
+
+            user_ids, self.insert_retry = self.insert_retry, []
+            while len(user_ids) < config.USER_INSERTS['batch_size'] and not self.insert_queue.empty():
+                user_ids.append(self.insert_queue.get_nowait())
+
+            try:
+                async with self.bot.db.acquire() as db, db.transaction():
+
+                    records = await db.fetch('INSERT INTO users (id) SELECT unnest($1::bigint[]) ON CONFLICT (id) DO NOTHING RETURNING id', user_ids)
+                    await db.execute(
+                            'INSERT INTO notifications (user_id) SELECT data.id FROM unnest($1::bigint[]) AS data(id) '
+                            'WHERE NOT EXISTS (SELECT 1 FROM notifications WHERE notifications.user_id = data.id)',
+                            user_ids
+                    )
+
+                    # Someone else (another shard, or a fetch that missed them) got there first, so the stored config wins and what was done in
+                    # memory is applied on top of it.
+                    inserted = {record['id'] for record in records}
+                    existing = []
+
+                    if len(inserted) != len(user_ids):
+                        existing = await db.fetch(f'{CONFIGS_QUERY} WHERE users.id = ANY($1::bigint[])', [user_id for user_id in user_ids if user_id not in inserted])
+
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError) as error:
+                __log__.error(f'[USER MANAGER] Failed to insert {len(user_ids)} new users, they will be retried. {error!r}')
+                self.insert_retry = user_ids + self.insert_retry
+                return
+
+            except asyncio.CancelledError:
+                self.insert_retry = user_ids + self.insert_retry
+                raise
+
+            for record in existing:
+                self._merge_provisional(build_config(record))
+
+            now = time.monotonic()
+
+            for user_id in user_ids:
+
+                if (provisional := self.provisional.pop(user_id, None)) is None:
+                    continue
+
+                created_at, future = provisional
+                self.insert_latencies.append(now - created_at)
+                future.set_result(None)
+
+            __log__.debug(f'[USER MANAGER] Inserted {len(inserted)} new users, {len(existing)} already existed.')
+
+    def _merge_provisional(self, user_config: objects.UserConfig) -> None:
+
+        if (provisional := self.configs.get(user_config.id)) is not None:
+
+            # Provisional configs start from nothing, so their xp and coins are exactly what was gained since.
+            user_config.xp += provisional.xp
+            user_config.coins += provisional.coins
+            user_config.requires_db_update = provisional.requires_db_update
+            user_config.reminders, user_config.todos = provisional.reminders, provisional.todos
+
+        self._store(user_config)
+
+    @property
+    def insert_metrics(self) -> dict[str, Union[int, float]]:
+
+        latencies = sorted(self.insert_latencies)
+
+        return {
+            'provisional':    len(self.provisional),
+            'queued':         self.insert_queue.qsize() + len(self.insert_retry),
+            'average_ms':     sum(latencies) / len(latencies) * 1000 if latencies else 0,
+            'p95_ms':         latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        }
+
+    def mark_dirty(self, user_config: objects.UserConfig, *columns: enums.Updateable) -> None:
+
+        user_config.requires_db_update.update(columns)
+        self.dirty.add(user_config.id)
 
     # User management
 
+    def _store(self, user_config: objects.UserConfig) -> None:
+
+        if (old := self.configs.get(user_config.id)) is not None:
+            timezones.registry.remove_user(old.id, old.timezone.name)
+
+        self.configs[user_config.id] = user_config
+        timezones.registry.add_user(user_config.id, user_config.timezone.name)
+        self._set_rank(user_config.id, 'xp', user_config.xp)
+        self._set_rank(user_config.id, 'coins', user_config.coins)
+        self.configs.move_to_end(user_config.id)
+        self.accessed[user_config.id] = time.monotonic()
+        self.missing.pop(user_config.id)
+
+        if self.lazy and len(self.configs) > self.max_size:
+            self._evict()
+
+    def _pinned(self, user_config: objects.UserConfig) -> bool:
+        # Unwritten changes, reminders and todos only exist in memory, so configs holding them have to stay.
+        return user_config.id in self.dirty or user_config.id in self.flushing or user_config.id in self.provisional or bool(user_config.requires_db_update or user_config.reminders or user_config.todos)
+
+    def _evict(self) -> None:
+
+        now = time.monotonic()
+
+        # Only the oldest few configs are looked at per call, so a store doesn't walk every pinned config once there are more of them than fit.
+        for _ in range(min(len(self.configs), EVICT_SCAN)):
+
+            user_id = next(iter(self.configs))
+
+            if len(self.configs) <= self.max_size and now - self.accessed[user_id] < self.max_idle:
+                break
+
+            if self._pinned(self.configs[user_id]):
+                # Pinned configs go to the back of the line so the next pass doesn't have to walk over them again.
+                self.configs.move_to_end(user_id)
+                self.accessed[user_id] = now
+                continue
+
+            user_config = self.configs.pop(user_id)
+            del self.accessed[user_id]
+            timezones.registry.remove_user(user_id, user_config.timezone.name)
+
+    async def _fetch(self, user_ids: list[int]) -> None:
+
+        records = await self.bot.db.fetch(f'{CONFIGS_QUERY} WHERE users.id = ANY($1::bigint[])', user_ids)
+
+        for record in records:
+
+            # Someone else may have loaded (and changed) this config while we were waiting on the database.
+            if record['users']['id'] in self.configs:
+                continue
+
+            self._store(build_config(record))
+
+        for user_id in user_ids:
+            if user_id not in self.configs:
+                self.missing.set(user_id, True)
+
+    async def prefetch(self, user_ids: Iterable[int]) -> None:
+
+        if not self.lazy:
+            return
+
+        user_ids = [user_id for user_id in set(user_ids) if user_id not in self.configs and user_id not in self.missing and user_id not in self.fetching]
+
+        for index in range(0, len(user_ids), 10000):
+            await self._fetch(user_ids[index:index + 10000])
+
+    async def prefetch_members(self, guild: discord.Guild) -> None:
+        await self.prefetch(member.id for member in guild.members)
+
     def get_config(self, user_id: int) -> Union[objects.DefaultUserConfig, objects.UserConfig]:
-        return self.configs.get(user_id, self.default_config)
 
-    async def create_config(self, user_id: int) -> objects.UserConfig:
+        if (user_config := self.configs.get(user_id)) is not None:
+            if self.lazy:
+                self.configs.move_to_end(user_id)
+                self.accessed[user_id] = time.monotonic()
+            return user_config
+
+        # Never blocks, a config that isn't loaded yet is fetched in the background and the default one is used until it arrives.
+        if self.lazy and user_id and user_id not in self.fetching and user_id not in self.missing:
+            asyncio.create_task(self.fetch_config(user_id))
+
+        return self.default_config
+
+    async def fetch_config(self, user_id: int) -> Union[objects.DefaultUserConfig, objects.UserConfig]:
+
+        if user_id in self.configs or not self.lazy or user_id in self.missing:
+            return self.get_config(user_id)
+
+        if (future := self.fetching.get(user_id)) is None:
+            future = self.fetching[user_id] = asyncio.ensure_future(self._fetch([user_id]))
+            future.add_done_callback(lambda _: self.fetching.pop(user_id, None))
+
+        await asyncio.shield(future)
+        return self.get_config(user_id)
+
+    async def create_config(self, user_id: int, *, wait: bool = True) -> objects.UserConfig:
+        """
+        Creates a config in memory right away, its rows are inserted by the next batch. Unless `wait` is False this returns once they have been.
+        """
+
+        if (provisional := self.provisional.get(user_id)) is not None:
+            if wait:
+                await self._wait_inserted(provisional[1])
+            return self.configs[user_id]
 
-        data = await self.bot.db.fetchrow('INSERT INTO users (id) values ($1) ON CONFLICT (id) DO UPDATE SET id = excluded.id RETURNING *', user_id)
-        notifications = await self.bot.db.fetchrow('INSERT INTO notifications (user_id) values ($1) ON CONFLICT (id) DO UPDATE SET id = excluded.user_id RETURNING *', user_id)
+        now = pendulum.now(tz='UTC')
+        default = self.default_config
 
-        user_config = objects.UserConfig(data=data)
-        user_config.notifications = objects.Notifications(data=notifications)
+        user_config = objects.UserConfig(data={
+            'id': user_id, 'created_at': now, 'blacklisted': False, 'blacklisted_reason': None, 'colour': f'0x{default.colour.value:06X}',
+            'timezone': default.timezone.name, 'timezone_private': False, 'birthday': default.birthday, 'birthday_private': False, 'xp': 0, 'coins': 0,
+            'daily_collected': now, 'daily_streak': 0, 'weekly_collected': now, 'weekly_streak': 0, 'monthly_collected': now, 'monthly_streak': 0,
+        })
+        user_config.notifications = objects.Notifications(data={'user_id': user_id})
 
-        self.configs[user_id] = user_config
+        future = asyncio.get_running_loop().create_future()
+        self.provisional[user_id] = (time.monotonic(), future)
+        self._store(user_config)
+
+        # Blocks while the queue is full, which holds back whatever is creating users this quickly until the inserter catches up.
+        try:
+            await self.insert_queue.put(user_id)
+        except BaseException:
+            # Cancelled while waiting for room. The config may already be in use, so rather than being unwound the user goes in the next batch.
+            self.insert_retry.append(user_id)
+            raise
         __log__.info(f'[USER MANAGER] Created config for user with id \'{user_id}\'')
 
-        return user_config
+        if wait:
+            await self._wait_inserted(future)
 
-    async def get_or_create_config(self, user_id: int) -> objects.UserConfig:
+        return self.configs[user_id]
+
+    async def _wait_inserted(self, future: asyncio.Future) -> None:
+
+        # The user stays queued for the inserter either way, only this caller gives up on a database that keeps failing.
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=config.USER_INSERTS['wait_timeout'])
+        except asyncio.TimeoutError:
+            raise exceptions.GeneralError('Your config could not be saved right now, please try again in a little while.') from None
 
-        if isinstance(user_config := self.get_config(user_id), objects.DefaultUserConfig):
-            user_config = await self.create_config(user_id)
+    async def get_or_create_config(self, user_id: int, *, wait: bool = True) -> objects.UserConfig:
+        """
+        `wait` can be False for callers that only change write-behind values (xp, coins), which don't need the user's row to exist yet.
+        """
+
+        if user_id in self.provisional:
+            return await self.create_config(user_id, wait=wait)
+
+        if isinstance(user_config := await self.fetch_config(user_id), objects.DefaultUserConfig):
+            user_config = await self.create_config(user_id, wait=wait)
 
         return user_config
 
@@ -143,11 +517,12 @@ class UserManager:
     async def set_timezone(self, user_id: int, *, timezone: str = None, private: bool = None) -> None:
 
         user_config = await self.get_or_create_config(user_id)
-        timezone = str(user_config.timezone) if timezone is None else timezone
+        timezone = user_config.timezone.name if timezone is None else timezone
         private = user_config.timezone_private if private is None else private
 
         data = await self.bot.db.fetchrow('UPDATE users SET timezone = $1, timezone_private = $2 WHERE id = $3 RETURNING timezone, timezone_private', timezone, private, user_id)
-        user_config.timezone = pendulum.timezone(data['timezone'])
+        timezones.registry.move_user(user_id, user_config.timezone.name, data['timezone'])
+        user_config.timezone = timezones.registry.get(data['timezone'])
         user_config.timezone_private = private
 
     async def set_birthday(self,  user_id: int, *, birthday: pendulum.datetime = None, private: bool = None) -> None:
@@ -164,7 +539,7 @@ class UserManager:
 
     async def set_coins(self, user_id: int, *, coins: int, operation: enums.Operation = enums.Operation.ADD) -> None:
 
-        user_config = await self.get_or_create_config(user_id)
+        user_config = await self.get_or_create_config(user_id, wait=False)
 
         if operation == enums.Operation.SET:
             user_config.coins = coins
@@ -173,11 +548,12 @@ class UserManager:
         elif operation == enums.Operation.MINUS:
             user_config.coins -= coins
 
-        user_config.requires_db_update.add(enums.Updateable.COINS)
+        self._set_rank(user_id, 'coins', user_config.coins)
+        self.mark_dirty(user_config, enums.Updateable.COINS)
 
     async def set_xp(self, user_id: int, *, xp: int, operation: enums.Operation = enums.Operation.ADD) -> None:
 
-        user_config = await self.get_or_create_config(user_id)
+        user_config = await self.get_or_create_config(user_id, wait=False)
 
         if operation == enums.Operation.SET:
             user_config.xp = xp
@@ -186,61 +562,84 @@ class UserManager:
         elif operation == enums.Operation.MINUS:
             user_config.xp -= xp
 
-        user_config.requires_db_update.add(enums.Updateable.XP)
+        self._set_rank(user_id, 'xp', user_config.xp)
+        self.mark_dirty(user_config, enums.Updateable.XP)
 
     async def set_bundle_collection(
             self, user_id: int, *, collection_type: Union[enums.Updateable.DAILY_COLLECTED, enums.Updateable.WEEKLY_COLLECTED, enums.Updateable.MONTHLY_COLLECTED],
-            when: DateTime = pendulum.now(tz='UTC')
+            when: DateTime = None
     ) -> None:
-
-        user_config = await self.get_or_create_config(user_id)
-
-        data = await self.bot.db.fetchrow(f'UPDATE users SET {collection_type.value} = $1 WHERE id = $2 RETURNING {collection_type.value}', when, user_id)
-        setattr(user_config, collection_type.value, pendulum.instance(data[collection_type.value], tz='UTC'))
+        await self.update_config(user_id, {collection_type: (enums.Operation.SET, when or pendulum.now(tz='UTC'))})
 
     async def set_bundle_streak(
             self, user_id: int, *, bundle_type: Union[enums.Updateable.DAILY_STREAK, enums.Updateable.WEEKLY_STREAK, enums.Updateable.MONTHLY_STREAK],
             operation: enums.Operation = enums.Operation.SET, count: int = 0
     ) -> None:
+        await self.update_config(user_id, {bundle_type: (operation, count)})
+
+    async def update_config(self, user_id: int, changes: dict[enums.Updateable, tuple[enums.Operation, Any]]) -> objects.UserConfig:
+        """
+        Applies several changes to one user with a single UPDATE, which is atomic on its own, then updates their config from the row it returns.
+        """
 
         user_config = await self.get_or_create_config(user_id)
 
-        streak = None
-        if operation == enums.Operation.SET:
-            streak = count
-        elif operation == enums.Operation.ADD:
-            streak = getattr(user_config, bundle_type.value) + count
-        elif operation == enums.Operation.MINUS:
-            streak = getattr(user_config, bundle_type.value) - count
-        elif operation == enums.Operation.RESET:
-            streak = 0
+        # Every new value is worked out from the config, which is always at least as recent as the database for the write-behind columns.
+        values = {}
+        for column, (operation, value) in changes.items():
+
+            if operation == enums.Operation.SET:
+                values[column] = value
+            elif operation == enums.Operation.ADD:
+                values[column] = getattr(user_config, column.value) + value
+            elif operation == enums.Operation.MINUS:
+                values[column] = getattr(user_config, column.value) - value
+            elif operation == enums.Operation.RESET:
+                values[column] = 0
+
+        assignments = ', '.join(f'{column.value} = ${index + 2}' for index, column in enumerate(values))
+        names = ', '.join(column.value for column in values)
+
+        data = await self.bot.db.fetchrow(f'UPDATE users SET {assignments} WHERE id = $1 RETURNING {names}', user_id, *values.values())
+
+        for column in values:
 
-        data = await self.bot.db.fetchrow(f'UPDATE users SET {bundle_type.value} = $1 WHERE id = $2 RETURNING {bundle_type.value}', streak, user_id)
-        setattr(user_config, bundle_type.value, data[bundle_type.value])
+            if column in (enums.Updateable.DAILY_COLLECTED, enums.Updateable.WEEKLY_COLLECTED, enums.Updateable.MONTHLY_COLLECTED):
+                setattr(user_config, column.value, pendulum.instance(data[column.value], tz='UTC'))
+                continue
+
+            setattr(user_config, column.value, data[column.value])
+
+            # A flush that captured an older value may still land after this, so the new one is written again by the next flush.
+            if column in (enums.Updateable.COINS, enums.Updateable.XP):
+                self._set_rank(user_id, column.value, data[column.value])
+                self.mark_dirty(user_config, column)
+
+        return user_config
 
     # Timecard image
 
     async def create_timecard(self, *, guild_id: int) -> discord.File:
 
         guild = self.bot.get_guild(guild_id)
+        await self.prefetch_members(guild)
 
-        user_configs = dict(filter(
-                lambda kv: guild.get_member(kv[0]) is not None and not kv[1].timezone_private and not kv[1].timezone == pendulum.timezone('UTC'),
-                sorted(self.configs.items(), key=lambda kv: kv[1].time.offset_hours)
-        ))
         timezone_avatars = {}
 
-        for user_config in user_configs.values():
+        for name, user_ids in timezones.registry.group((member.id for member in guild.members), exclude={'UTC'}):
+
+            # Configs can be evicted while avatars are being downloaded, users without one are left out like private ones.
+            user_ids = [user_id for user_id in user_ids if (user_config := self.configs.get(user_id)) is not None and not user_config.timezone_private]
+            if not user_ids:
+                continue
 
-            avatar_bytes = io.BytesIO(await guild.get_member(user_config.id).avatar_url_as(format='png', size=256).read())
-            timezone = user_config.time.format('HH:mm (ZZ)')
+            timezone = timezones.registry.now(name).format('HH:mm (ZZ)')
+            avatars = timezone_avatars.setdefault(timezone, [])
 
-            if users := timezone_avatars.get(timezone, []):
-                if len(users) > 36:
+            for user_id in user_ids:
+                if len(avatars) > 36:
                     break
-                timezone_avatars[timezone].append(avatar_bytes)
-            else:
-                timezone_avatars[timezone] = [avatar_bytes]
+                avatars.append(io.BytesIO(await guild.get_member(user_id).avatar_url_as(format='png', size=256).read()))
 
         if not timezone_avatars:
             raise exceptions.ArgumentError('There are no users with timezones set in this server.')
@@ -296,48 +695,148 @@ class UserManager:
 
     # Ranking
 
-    def leaderboard(self, *, guild_id: int = None, lb_type: Literal['level', 'xp', 'coins']) -> list[objects.UserConfig]:
+    def _set_rank(self, user_id: int, lb_type: Literal['xp', 'coins'], value: int) -> None:
+
+        getattr(self, f'{lb_type}_index').set(user_id, value)
+
+        for guild_id in self.member_guilds.get(user_id, ()):
+            getattr(self.guild_ranks[guild_id], lb_type).set(user_id, value)
+
+    def get_guild_ranks(self, guild: discord.Guild) -> leaderboards.GuildRanks:
+
+        if (guild_ranks := self.guild_ranks.get(guild.id)) is None:
+
+            member_ids = [member.id for member in guild.members]
+
+            guild_ranks = self.guild_ranks[guild.id] = leaderboards.GuildRanks(
+                    member_ids,
+                    xp={user_id: xp for user_id in member_ids if (xp := self.xp_index.get(user_id)) is not None},
+                    coins={user_id: coins for user_id in member_ids if (coins := self.coins_index.get(user_id)) is not None},
+                    accessed=time.monotonic()
+            )
+
+            for user_id in member_ids:
+                self.member_guilds.setdefault(user_id, set()).add(guild.id)
+
+        guild_ranks.accessed = time.monotonic()
+        return guild_ranks
+
+    def drop_guild_ranks(self, guild_id: int) -> None:
+
+        if (guild_ranks := self.guild_ranks.pop(guild_id, None)) is None:
+            return
+
+        for user_id in guild_ranks.member_ids:
+            self._forget_member_guild(user_id, guild_id)
+
+    def _forget_member_guild(self, user_id: int, guild_id: int) -> None:
+
+        if (guild_ids := self.member_guilds.get(user_id)) is None:
+            return
+
+        guild_ids.discard(guild_id)
+        if not guild_ids:
+            del self.member_guilds[user_id]
+
+    def add_member(self, member: discord.Member) -> None:
+
+        if (guild_ranks := self.guild_ranks.get(member.guild.id)) is None or member.id in guild_ranks.member_ids:
+            return
+
+        guild_ranks.member_ids.add(member.id)
+        self.member_guilds.setdefault(member.id, set()).add(member.guild.id)
+
+        if (xp := self.xp_index.get(member.id)) is not None:
+            guild_ranks.xp.set(member.id, xp)
+        if (coins := self.coins_index.get(member.id)) is not None:
+            guild_ranks.coins.set(member.id, coins)
+
+    def remove_member(self, member: discord.Member) -> None:
+
+        if (guild_ranks := self.guild_ranks.get(member.guild.id)) is None:
+            return
+
+        guild_ranks.discard(member.id)
+        self._forget_member_guild(member.id, member.guild.id)
+
+    def leaderboard(
+            self, *, guild_id: int = None, lb_type: Literal['level', 'xp', 'coins'], position: int = 0, limit: int = 10
+    ) -> tuple[list[tuple[int, int]], Optional[int]]:
+        """
+        Returns up to `limit` (user_id, value) pairs in leaderboard order, starting from `position` in the index and skipping users with nothing to
+        show, along with the position to carry on from for the next page (None once there is nothing left).
+        """
 
         if not guild_id:
-            configs = filter(lambda kv: self.bot.get_user(kv[1].id) is not None and getattr(kv[1], lb_type) != 0, self.configs.items())
+            index = self.coins_index if lb_type == 'coins' else self.xp_index
+            is_eligible = lambda user_id: self.bot.get_user(user_id) is not None
 
         else:
             guild = self.bot.get_guild(guild_id)
             if not guild:
                 raise exceptions.ArgumentError('Guild with that id not found.')
 
-            configs = filter(lambda kv: guild.get_member(kv[1].id) is not None and getattr(kv[1], lb_type) != 0, self.configs.items())
+            guild_ranks = self.get_guild_ranks(guild)
+            index = guild_ranks.coins if lb_type == 'coins' else guild_ranks.xp
+            is_eligible = lambda user_id: True
+
+        leaderboard = []
 
-        return sorted(configs, key=lambda kv: getattr(kv[1], lb_type), reverse=True)
+        # Only as much of the index as the page needs is read, a little more for every user that gets skipped.
+        while len(leaderboard) < limit:
+
+            if not (chunk := list(index.top(position, position + limit))):
+                return leaderboard, None
+
+            for user_id, value in chunk:
+
+                position += 1
+                value = objects.level_for(value) if lb_type == 'level' else value
+
+                # The index is in descending order, so nobody after this has anything to show either.
+                if value == 0:
+                    return leaderboard, None
+
+                if not is_eligible(user_id):
+                    continue
+
+                leaderboard.append((user_id, value))
+                if len(leaderboard) >= limit:
+                    break
+
+        return leaderboard, position
 
     def rank(self, user_id: int, *, guild_id: int = None) -> int:
 
         if not guild_id:
-            configs = dict(sorted(self.configs.items(), key=lambda kv: kv[1].xp, reverse=True))
+            rank = self.xp_index.rank(user_id)
 
         else:
             guild = self.bot.get_guild(guild_id)
             if not guild:
                 raise exceptions.ArgumentError('Guild with that id not found.')
 
-            configs = dict(sorted(filter(lambda kv: guild.get_member(kv[1].id) is not None and kv[1].xp != 0, self.configs.items()), key=lambda kv: kv[1].xp, reverse=True))
+            # Members without any xp sort after everyone that has some, so they don't change anyone else's rank.
+            index = self.get_guild_ranks(guild).xp
+            rank = index.rank(user_id) if index.get(user_id) else None
 
-        try:
-            return list(configs.keys()).index(user_id) + 1
-        except ValueError:
+        if rank is None:
             raise exceptions.ArgumentError('That user does not have a rank yet.')
 
+        return rank
+
     # Level image
 
     async def create_level_card(self, user_id: int, *, guild_id: int) -> discord.File:
 
         guild = self.bot.get_guild(guild_id)
         user = guild.get_member(user_id)
-        user_config = self.get_config(user_id)
+        user_config = await self.fetch_config(user_id)
 
         avatar_bytes = io.BytesIO(await user.avatar_url_as(format='png', size=256).read())
+        rank = self.rank(user_id)
 
-        buffer = await self.bot.loop.run_in_executor(None, self.create_level_card_image, user, user_config, avatar_bytes)
+        buffer = await self.bot.loop.run_in_executor(None, self.create_level_card_image, user, user_config, avatar_bytes, rank)
         file = discord.File(fp=buffer, filename='level.png')
 
         buffer.close()
@@ -345,7 +844,7 @@ class UserManager:
 
         return file
 
-    def create_level_card_image(self, member: Union[discord.Member, discord.User], user_config: objects.UserConfig, avatar_bytes: io.BytesIO) -> io.BytesIO:
+    def create_level_card_image(self, member: Union[discord.Member, discord.User], user_config: objects.UserConfig, avatar_bytes: io.BytesIO, rank: int) -> io.BytesIO:
 
         buffer = io.BytesIO()
         card_image = random.choice(self.IMAGES['SAI']['level_cards'])
@@ -400,7 +899,7 @@ class UserManager:
 
             # Rank
 
-            rank_text = f'#{self.rank(member.id)}'
+            rank_text = f'#{rank}'
             rank_font = ImageFont.truetype(self.KABEL_BLACK_FONT, 110)
 
             draw.text((300, 202 - rank_font.getoffset(rank_text)[1]), rank_text, font=rank_font, fill='#1F1E1C')
@@ -0,0 +1,116 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+# Pillow + NumPy versions of the operations that only move pixels around (flips and transposes). They run in the image workers like every other
+# edit, but skip Wand's much slower decode/encode. Images are edited in their own mode and written back with the settings they were read with
+# (palette, transparency, jpeg quantization tables), and formats where that isn't possible (gifs, webp) are left to Wand.
+
+import io
+import json
+import logging
+import pathlib
+from typing import Optional
+
+import numpy
+from PIL import Image, JpegImagePlugin
+
+__log__ = logging.getLogger(__name__)
+
+
+def flip(array: numpy.ndarray) -> tuple[numpy.ndarray, Optional[str]]:
+    return array[::-1], None
+
+
+def flop(array: numpy.ndarray) -> tuple[numpy.ndarray, Optional[str]]:
+    return array[:, ::-1], None
+
+
+def transpose(array: numpy.ndarray) -> tuple[numpy.ndarray, Optional[str]]:
+    return numpy.swapaxes(array, 0, 1), None
+
+
+def transverse(array: numpy.ndarray) -> tuple[numpy.ndarray, Optional[str]]:
+    return numpy.swapaxes(array[::-1, ::-1], 0, 1), None
+
+
+ARRAY_OPERATIONS = {
+    'flip': flip,
+    'flop': flop,
+    'transpose': transpose,
+    'transverse': transverse,
+}
+
+FORMATS = {'png', 'jpeg'}
+MODES = {'L', 'LA', 'P', 'RGB', 'RGBA'}
+# Most pixels that are decoded at once, bigger images are left to Wand, which the workers budget.
+MAX_PIXELS = 50_000_000
+BACKENDS_PATH = pathlib.Path(__file__).parent.parent / 'resources' / 'imaging_backends.json'
+
+
+def _load_backends() -> dict[str, str]:
+
+    # Written by `python -m benchmarks.imaging_backends`, until it has been run every operation we support here is assumed to be faster.
+    try:
+        with BACKENDS_PATH.open() as file:
+            return json.load(file)['backends']
+    except (OSError, ValueError, KeyError):
+        return {edit_type: 'numpy' for edit_type in ARRAY_OPERATIONS}
+
+
+BACKENDS = _load_backends()
+
+
+def supports(steps: list[tuple[str, dict]], image_format: Optional[str]) -> bool:
+    return image_format in FORMATS and all(edit_type in ARRAY_OPERATIONS and BACKENDS.get(edit_type) == 'numpy' for edit_type, _ in steps)
+
+
+def _run_steps(array: numpy.ndarray, steps: list[tuple[str, dict]]) -> tuple[numpy.ndarray, Optional[str]]:
+
+    texts = []
+    for edit_type, options in steps:
+        array, text = ARRAY_OPERATIONS[edit_type](array, **options)
+        texts.append(f'{edit_type} ({text})' if text else edit_type)
+
+    # Matches the footer text of the Wand backend, a single step only shows its own options.
+    if len(steps) == 1:
+        return array, text
+
+    return array, ' → '.join(texts)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def edit(image_bytes: bytes, steps: list[tuple[str, dict]]) -> tuple[bytes, str, Optional[str]]:
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+
+        # Only the header has been read so far.
+        if image.format not in ('PNG', 'JPEG') or image.mode not in MODES or image.width * image.height > MAX_PIXELS or getattr(image, 'n_frames', 1) > 1:
+            raise Unsupported()
+
+        image_format = image.format
+        array, text = _run_steps(numpy.asarray(image), steps)
+
+        edited = Image.fromarray(numpy.ascontiguousarray(array), image.mode)
+        if image.mode == 'P':
+            edited.putpalette(image.getpalette())
+
+        options = {key: image.info[key] for key in ('transparency', 'icc_profile', 'exif', 'dpi') if key in image.info}
+        if image_format == 'JPEG':
+            options.update(qtables=image.quantization, subsampling=JpegImagePlugin.get_sampling(image))
+
+        buffer = io.BytesIO()
+        edited.save(buffer, format=image_format, **options)
+
+    return buffer.getvalue(), image_format, text
@@ -0,0 +1,78 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+import collections
+import time
+from typing import Any, Hashable, Iterator, Optional
+
+__all__ = ['LRUCache']
+
+_MISSING = object()
+
+
+class LRUCache:
+
+    __slots__ = 'max_size', 'ttl', '_items'
+
+    def __init__(self, *, max_size: int, ttl: Optional[float] = None) -> None:
+
+        self.max_size: int = max_size
+        self.ttl: Optional[float] = ttl
+
+        self._items: collections.OrderedDict[Hashable, tuple[Optional[float], Any]] = collections.OrderedDict()
+
+    def __repr__(self) -> str:
+        return f'<LRUCache size={len(self._items)} max_size={self.max_size} ttl={self.ttl}>'
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._items))
+
+    #
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+
+        if (item := self._items.get(key, _MISSING)) is _MISSING:
+            return default
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._items[key]
+            return default
+
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, *, ttl: Optional[float] = None) -> None:
+
+        ttl = ttl or self.ttl
+
+        self._items[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+
+        if (item := self._items.pop(key, _MISSING)) is _MISSING:
+            return default
+
+        return item[1]
+
+    def clear(self) -> None:
+        self._items.clear()
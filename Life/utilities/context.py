@@ -43,7 +43,7 @@ class Context(commands.Context):
 
     @property
     def user_config(self) -> Union[objects.DefaultUserConfig, objects.UserConfig]:
-        return self.bot.user_manager.configs.get(getattr(self.author, 'id', None), self.bot.user_manager.default_config)
+        return self.bot.user_manager.get_config(getattr(self.author, 'id', None))
 
     @property
     def guild_config(self) -> Union[objects.DefaultGuildConfig, objects.GuildConfig]:
@@ -60,6 +60,11 @@ class Context(commands.Context):
 
     #
 
+    async def fetch_user_config(self) -> Union[objects.DefaultUserConfig, objects.UserConfig]:
+        return await self.bot.user_manager.fetch_config(getattr(self.author, 'id', None))
+
+    #
+
     async def paginate(self, **kwargs) -> paginators.Paginator:
         paginator = paginators.Paginator(ctx=self, **kwargs)
         await paginator.paginate()
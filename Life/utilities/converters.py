@@ -22,7 +22,7 @@ from discord.ext import commands
 from pendulum.tz.timezone import Timezone
 
 import config
-from utilities import context, enums, exceptions, utils
+from utilities import context, enums, exceptions, timezones, utils
 
 
 class UserConverter(commands.UserConverter):
@@ -54,7 +54,7 @@ class TimezoneConverter(commands.Converter, ABC):
             ))
             raise exceptions.ArgumentError(f'That was not a recognised timezone. Maybe you meant one of these?\n{msg}')
 
-        return pendulum.timezone(argument)
+        return timezones.registry.get(argument)
 
 
 class TagNameConverter(commands.clean_content, ABC):
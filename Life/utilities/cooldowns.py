@@ -0,0 +1,172 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+import asyncio
+import logging
+import math
+import time
+from typing import Hashable, Optional
+
+import aredis
+
+__all__ = ['TimingWheel', 'XPCooldown']
+__log__ = logging.getLogger(__name__)
+
+
+class TimingWheel:
+
+    # Keys that expire a fixed duration after they were added. Each key is filed into the slot of the tick it expires in, and as time moves on
+    # whole slots of expired keys are dropped at once, so neither checking a key nor cleaning up after it ever has to look at the other keys.
+
+    __slots__ = 'duration', 'resolution', '_slots', '_expires', '_tick'
+
+    def __init__(self, *, duration: float, resolution: float = 1.0) -> None:
+
+        self.duration: float = duration
+        self.resolution: float = resolution
+
+        # Two spare slots so that a live key's slot is never reused before it has expired.
+        self._slots: list[set[Hashable]] = [set() for _ in range(math.ceil(duration / resolution) + 2)]
+        self._expires: dict[Hashable, float] = {}
+        self._tick: int = int(time.monotonic() // resolution)
+
+    def __repr__(self) -> str:
+        return f'<TimingWheel size={len(self._expires)} duration={self.duration} resolution={self.resolution}>'
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return (expires := self._expires.get(key)) is not None and expires > time.monotonic()
+
+    #
+
+    def _advance(self, now: float) -> None:
+
+        tick = int(now // self.resolution)
+        if tick == self._tick:
+            return
+
+        # Every key in the slots of ticks that have fully passed has expired, unless it has since been added again with a later expiry, in which case
+        # it is left for a later turn of the wheel.
+        cutoff = tick * self.resolution
+
+        for passed in range(max(self._tick, tick - len(self._slots)), tick):
+
+            slot = self._slots[passed % len(self._slots)]
+            for key in [key for key in slot if (expires := self._expires.get(key)) is None or expires < cutoff]:
+                slot.discard(key)
+                self._expires.pop(key, None)
+
+        self._tick = tick
+
+    def add(self, key: Hashable) -> bool:
+        """
+        Adds the key unless it is already present, returns whether it was added.
+        """
+
+        now = time.monotonic()
+        self._advance(now)
+
+        if (expires := self._expires.get(key)) is not None and expires > now:
+            return False
+
+        expires = self._expires[key] = now + self.duration
+        self._slots[int(expires // self.resolution) % len(self._slots)].add(key)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+        # The key is left in its slot, which is fine as slots check expiries before dropping anything.
+        self._expires.pop(key, None)
+
+
+class XPCooldown:
+
+    # Decides whether a user can gain xp from a message. The in-process wheel answers on its own unless a redis client is given, in which case users
+    # that are off cooldown locally are also claimed in redis (so that other shards see them) with a single pipelined SET NX per batch of messages.
+
+    __slots__ = 'seconds', 'redis', 'batch_delay', 'batch_size', 'wheel', '_pending', '_flush_handle'
+
+    def __init__(self, *, seconds: float, redis: Optional[aredis.StrictRedis] = None, batch_delay: float = 0.01, batch_size: int = 500) -> None:
+
+        self.seconds: float = seconds
+        self.redis: Optional[aredis.StrictRedis] = redis
+
+        self.batch_delay: float = batch_delay
+        self.batch_size: int = batch_size
+
+        self.wheel: TimingWheel = TimingWheel(duration=seconds)
+
+        self._pending: list[tuple[int, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def __repr__(self) -> str:
+        return f'<XPCooldown seconds={self.seconds} users={len(self.wheel)} mirrored={self.redis is not None}>'
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f'{user_id}_xp_gain'
+
+    async def acquire(self, user_id: int) -> bool:
+        """
+        Puts the user on cooldown if they are not on it already, returns whether they were able to gain xp.
+        """
+
+        if not self.wheel.add(user_id):
+            return False
+
+        if self.redis is None:
+            return True
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_id, future))
+
+        if len(self._pending) >= self.batch_size:
+            self._schedule_flush(loop, 0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, self.batch_delay)
+
+        return await future
+
+    def _schedule_flush(self, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+
+        self._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self) -> None:
+
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+
+        if not pending:
+            return
+
+        # The local wheel has already put these users on cooldown, which is good enough for this shard until redis is back.
+        results = [True] * len(pending)
+
+        try:
+            async with await self.redis.pipeline(transaction=False) as pipeline:
+                for user_id, _ in pending:
+                    await pipeline.set(self.key(user_id), 1, ex=math.ceil(self.seconds), nx=True)
+                results = await pipeline.execute()
+
+        except Exception as error:
+            __log__.warning(f'[XP COOLDOWN] Error while mirroring {len(pending)} cooldowns to redis: {error!r}')
+
+        finally:
+            # Resolved even if the flush was cancelled, anything awaiting these would otherwise wait forever.
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(bool(result))
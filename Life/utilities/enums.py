@@ -82,3 +82,10 @@ class ReminderRepeatType(enum.Enum):
     EVERY_YEAR = 13
     EVERY_OTHER_YEAR = 14
     BI_YEARLY = EVERY_OTHER_YEAR
+
+
+class ImageCost(enum.Enum):
+
+    CHEAP = 0
+    MODERATE = 1
+    EXPENSIVE = 2
@@ -10,13 +10,32 @@
 #  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
 #
 
-import io
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import hashlib
+import heapq
+import html
+import itertools
+import json
+import logging
+import math
 import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import re
+import secrets
+import signal
 import sys
-from typing import Callable, Optional, Union
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Awaitable, Callable, Optional, Union
 
 import aiohttp
-import bs4
+import aredis
 import discord
 import humanize
 import yarl
@@ -25,7 +44,9 @@ from wand.image import Image
 from wand.sequence import SingleImage
 
 import config
-from utilities import context, exceptions
+from utilities import array_imaging, cache, context, enums, exceptions
+
+__log__ = logging.getLogger(__name__)
 
 
 def adaptive_blur(image: Union[Image, SingleImage], radius: float = 0, sigma: float = 0) -> Optional[str]:
@@ -283,149 +304,1012 @@ def cube(image: Union[Image, SingleImage]) -> Optional[str]:
 
 
 IMAGE_OPERATIONS = {
-    'adaptive_blur': adaptive_blur,
-    'adaptive_sharpen': adaptive_sharpen,
-    'blueshift': blueshift,
-    'blur': blur,
-    'border': border,
-    'edge': edge,
-    'charcoal': charcoal,
-    'colorize': colorize,
-    'despeckle': despeckle,
-    'floor': floor,
-    'emboss': emboss,
-    'enhance': enhance,
-    'flip': flip,
-    'flop': flop,
-    'frame': frame,
-    'gaussian_blur': gaussian_blur,
-    'implode': implode,
-    'kmeans': kmeans,
-    'kuwahara': kuwahara,
-    'motion_blur': motion_blur,
-    'negate': negate,
-    'noise': noise,
-    'oil_paint': oil_paint,
-    'polaroid': polaroid,
-    'rotate': rotate,
-    'sepia_tone': sepia_tone,
-    'sharpen': sharpen,
-    'solarize': solarize,
-    'spread': spread,
-    'swirl': swirl,
-    'transparentize': transparentize,
-    'transpose': transpose,
-    'transverse': transverse,
-    'wave': wave,
-    'cube': cube,
+    'adaptive_blur': (adaptive_blur, enums.ImageCost.MODERATE),
+    'adaptive_sharpen': (adaptive_sharpen, enums.ImageCost.MODERATE),
+    'blueshift': (blueshift, enums.ImageCost.CHEAP),
+    'blur': (blur, enums.ImageCost.MODERATE),
+    'border': (border, enums.ImageCost.CHEAP),
+    'edge': (edge, enums.ImageCost.MODERATE),
+    'charcoal': (charcoal, enums.ImageCost.EXPENSIVE),
+    'colorize': (colorize, enums.ImageCost.CHEAP),
+    'despeckle': (despeckle, enums.ImageCost.MODERATE),
+    'floor': (floor, enums.ImageCost.MODERATE),
+    'emboss': (emboss, enums.ImageCost.MODERATE),
+    'enhance': (enhance, enums.ImageCost.MODERATE),
+    'flip': (flip, enums.ImageCost.CHEAP),
+    'flop': (flop, enums.ImageCost.CHEAP),
+    'frame': (frame, enums.ImageCost.CHEAP),
+    'gaussian_blur': (gaussian_blur, enums.ImageCost.MODERATE),
+    'implode': (implode, enums.ImageCost.EXPENSIVE),
+    'kmeans': (kmeans, enums.ImageCost.EXPENSIVE),
+    'kuwahara': (kuwahara, enums.ImageCost.EXPENSIVE),
+    'motion_blur': (motion_blur, enums.ImageCost.MODERATE),
+    'negate': (negate, enums.ImageCost.CHEAP),
+    'noise': (noise, enums.ImageCost.MODERATE),
+    'oil_paint': (oil_paint, enums.ImageCost.EXPENSIVE),
+    'polaroid': (polaroid, enums.ImageCost.MODERATE),
+    'rotate': (rotate, enums.ImageCost.CHEAP),
+    'sepia_tone': (sepia_tone, enums.ImageCost.CHEAP),
+    'sharpen': (sharpen, enums.ImageCost.MODERATE),
+    'solarize': (solarize, enums.ImageCost.CHEAP),
+    'spread': (spread, enums.ImageCost.MODERATE),
+    'swirl': (swirl, enums.ImageCost.MODERATE),
+    'transparentize': (transparentize, enums.ImageCost.CHEAP),
+    'transpose': (transpose, enums.ImageCost.CHEAP),
+    'transverse': (transverse, enums.ImageCost.CHEAP),
+    'wave': (wave, enums.ImageCost.MODERATE),
+    'cube': (cube, enums.ImageCost.EXPENSIVE),
+}
+
+# Megapixels and frames an image is cut down to before an operation of each cost runs on it, anything bigger is just slower to edit
+# and gets shrunk by discord's embed anyway.
+IMAGE_BUDGETS = {
+    enums.ImageCost.MODERATE:  (4, 150),
+    enums.ImageCost.EXPENSIVE: (1, 50),
+}
+
+# How far a job of each cost moves its guild's virtual clock in the image pool's fair queue.
+COST_WEIGHTS = {
+    enums.ImageCost.CHEAP:     1,
+    enums.ImageCost.MODERATE:  4,
+    enums.ImageCost.EXPENSIVE: 16,
 }
 
 MAX_CONTENT_SIZE = (2 ** 20) * 25
-VALID_CONTENT_TYPES = ['image/gif', 'image/heic', 'image/jpeg', 'image/png', 'image/webp', 'image/avif', 'image/svg+xml']
+MIN_FRAMES_PER_CHUNK = 10
 COMMON_GIF_SITES = ['tenor.com', 'giphy.com']
 
+CHUNK_SIZE = 2 ** 16
+SNIFF_SIZE = 2 ** 10
+MAX_PAGE_SIZE = 2 ** 19
+
+HEIC_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1'}
+AVIF_BRANDS = {b'avif', b'avis'}
+
+# An svg document has to open with its root element, optionally after a BOM, an xml declaration, comments and an svg doctype. This keeps html
+# pages that merely contain an inline svg from passing as images.
+_SVG_DOCUMENT = re.compile(
+        rb'\A(?:\xef\xbb\xbf)?\s*(?:<\?xml[^>]*\?>\s*)?(?:(?:<!--.*?-->|<!DOCTYPE\s+svg[^>]*>)\s*)*<svg[\s>/]', flags=re.IGNORECASE | re.DOTALL
+)
+
+_META_TAG = re.compile(rb'<meta\s[^>]*>', flags=re.IGNORECASE)
+_OG_URL_PROPERTY = re.compile(rb'property\s*=\s*["\']og:url["\']', flags=re.IGNORECASE)
+_CONTENT_ATTRIBUTE = re.compile(rb'content\s*=\s*["\']([^"\']+)["\']', flags=re.IGNORECASE)
+
 CDN_UPLOAD_URL = 'https://media.mrrandom.xyz/api/media'
 CDN_HEADERS = {'Authorization': config.AXEL_WEB_TOKEN}
+CDN_CONNECTIONS = 8
+CDN_ATTEMPTS = 3
+CDN_BACKOFF = 0.5
+CDN_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10, sock_read=30)
+CDN_HISTOGRAM_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+CACHE_URL_TTL = 60 * 60 * 24
+CACHE_RESULT_TTL = 60 * 60 * 24
+UNCACHEABLE_OPERATIONS = {'noise', 'spread'}
+
+MAX_PIPELINE_STEPS = 10
+
+_cache = cache.LRUCache(max_size=512, ttl=CACHE_URL_TTL)
+
+
+class SharedImage:
+
+    __slots__ = 'memory', 'length', '_view'
+
+    def __init__(self, memory: shared_memory.SharedMemory, length: int) -> None:
+
+        self.memory = memory
+        self.length = length
+
+        self._view: Optional[memoryview] = None
+
+    def __repr__(self) -> str:
+        return f'<SharedImage name=\'{self.name}\' length={self.length}>'
+
+    @classmethod
+    def create(cls, data: Union[bytes, bytearray], *, name: Optional[str] = None) -> SharedImage:
+
+        memory = shared_memory.SharedMemory(name=name, create=True, size=max(len(data), 1))
+        memory.buf[:len(data)] = data
+
+        return cls(memory=memory, length=len(data))
+
+    @classmethod
+    def attach(cls, name: str, length: int) -> SharedImage:
+        return cls(memory=shared_memory.SharedMemory(name=name), length=length)
+
+    #
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    @property
+    def handle(self) -> tuple[str, int]:
+        return self.memory.name, self.length
+
+    @property
+    def buffer(self) -> memoryview:
+
+        if self._view is None:
+            self._view = self.memory.buf[:self.length]
+
+        return self._view
+
+    def close(self) -> None:
+
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+        self.memory.close()
+
+    def unlink(self) -> None:
+
+        self.close()
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _discard_outputs(prefix: str) -> None:
+
+    # Workers name their outputs `<prefix>_0`, `<prefix>_1`, ... in order, so whatever a job managed to create is found by counting up.
+    for index in itertools.count():
+        try:
+            memory = shared_memory.SharedMemory(name=f'{prefix}_{index}')
+        except FileNotFoundError:
+            return
+        SharedImage(memory=memory, length=0).unlink()
+
+
+def _apply_budget(image: Image, *, cost: enums.ImageCost) -> Optional[str]:
+
+    if (budget := IMAGE_BUDGETS.get(cost)) is None:
+        return None
+
+    megapixels, max_frames = budget
+    applied = []
+
+    if (pixels := image.width * image.height) > megapixels * 1_000_000:
+        scale = math.sqrt(megapixels * 1_000_000 / pixels)
+        image.resize(width=max(1, int(image.width * scale)), height=max(1, int(image.height * scale)))
+        applied.append(f'{megapixels}MP')
+
+    if (frames := len(image.sequence)) > max_frames:
+
+        # Keep every nth frame and give it the delays of the frames dropped after it, so the gif still plays at the same speed.
+        step = math.ceil(frames / max_frames)
+        delays = [frame.delay for frame in image.sequence]
+
+        for index in reversed(range(frames)):
+            if index % step:
+                del image.sequence[index]
+            else:
+                with image.sequence[index] as frame:
+                    frame.delay = sum(delays[index:index + step])
+
+        applied.append(f'{len(image.sequence)} frames')
+
+    return f'Budget: {", ".join(applied)}' if applied else None
+
+
+def _run_steps(image: Union[Image, SingleImage], steps: list[tuple[str, dict]]) -> Optional[str]:
+
+    if len(steps) == 1:
+        edit_type, options = steps[0]
+        return IMAGE_OPERATIONS[edit_type][0](image, **options)
+
+    texts = []
+    for edit_type, options in steps:
+        text = IMAGE_OPERATIONS[edit_type][0](image, **options)
+        texts.append(f'{edit_type} ({text})' if text else edit_type)
+
+    return ' → '.join(texts)
+
+
+def _edit_task(images: list[bytes], *, steps: list[tuple[str, dict]], chunks: int = 1, intermediate: bool = False) -> tuple[list[bytes], dict]:
+
+    # A pipeline is budgeted for its most costly step, which only has to happen once since every step works on the same decoded image.
+    cost = max((IMAGE_OPERATIONS[edit_type][1] for edit_type, _ in steps), key=lambda cost: cost.value)
+    text = None
+
+    with Image(blob=images[0]) as image:
+
+        # Chunks of a split gif come and go as MIFF, see _split_frames.
+        image_format = image.format
+        if image_format not in ('GIF', 'MIFF'):
+            budget = _apply_budget(image, cost=cost)
+            text = _run_steps(image, steps)
+            return [image.make_blob()], {'image_format': image_format, 'text': text, 'budget': budget}
+
+        image.coalesce()
+        budget = _apply_budget(image, cost=cost)
+
+        # Big gifs are handed back in chunks so the bot can spread them over several workers, small ones aren't worth the extra encode.
+        if (chunks := min(chunks, len(image.sequence) // MIN_FRAMES_PER_CHUNK)) > 1:
+            blobs, metadata = _split_frames(image, chunks=chunks)
+            return blobs, {**metadata, 'budget': budget}
+
+        for x in image.sequence:
+            with x as image_frame:
+                text = _run_steps(image_frame, steps)
+
+        if intermediate:
+            return [_intermediate_blob(image)], {'image_format': 'MIFF', 'text': text, 'budget': budget}
 
+        image.optimize_transparency()
+        return [image.make_blob()], {'image_format': image_format, 'text': text, 'budget': budget}
 
-def _do_edit_image(child_pipe: multiprocessing.Pipe, edit_function: Callable, image_bytes: bytes, **kwargs):
+
+def _intermediate_blob(image: Image) -> bytes:
+
+    # ImageMagick's own format with zip compression is lossless, so frames passed between jobs are not quantized to a gif palette on every hop.
+    image.format = 'MIFF'
+    image.compression = 'zip'
+    return image.make_blob()
+
+
+def _split_frames(image: Image, *, chunks: int) -> tuple[list[bytes], dict]:
+
+    frames = len(image.sequence)
+    size = math.ceil(frames / chunks)
+
+    delays, disposes = [], []
+    for frame in image.sequence:
+        delays.append(frame.delay)
+        disposes.append(frame.dispose)
+
+    blobs = []
+    for start in range(0, frames, size):
+        with Image() as chunk:
+            for index in range(start, min(start + size, frames)):
+                chunk.sequence.append(image.sequence[index])
+            blobs.append(_intermediate_blob(chunk))
+
+    return blobs, {'image_format': 'GIF', 'split': True, 'delays': delays, 'disposes': disposes, 'loop': image.loop}
+
+
+def _join_task(images: list[bytes], *, delays: list[int], disposes: list[str], loop: int) -> tuple[list[bytes], dict]:
+
+    with Image() as image:
+
+        for blob in images:
+            with Image(blob=blob) as chunk:
+                image.sequence.extend(chunk.sequence)
+
+        for index, (delay, dispose) in enumerate(zip(delays, disposes)):
+            with image.sequence[index] as frame:
+                frame.delay = delay
+                frame.dispose = dispose
+
+        image.format = 'GIF'
+        image.loop = loop
+        image.optimize_transparency()
+
+        return [image.make_blob()], {'image_format': 'GIF'}
+
+
+def _array_edit_task(images: list[bytes], *, steps: list[tuple[str, dict]]) -> tuple[list[bytes], dict]:
 
     try:
+        blob, image_format, text = array_imaging.edit(images[0], steps)
+    except array_imaging.Unsupported:
+        return _edit_task(images, steps=steps)
+
+    return [blob], {'image_format': image_format, 'text': text, 'budget': None}
+
+
+WORKER_TASKS = {
+    'edit': _edit_task,
+    'array_edit': _array_edit_task,
+    'join': _join_task,
+}
+
+
+def _worker(connection: multiprocessing.connection.Connection) -> None:
+
+    # Ctrl-C is handled by the bot process, which shuts the pool down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+
+        if job is None:
+            return
+
+        task, handles, prefix, kwargs = job
+
+        try:
+
+            # Wand only reads from bytes, so this is the one copy of each source image made on this side.
+            images = []
+            for handle in handles:
+                source = SharedImage.attach(*handle)
+                images.append(bytes(source.buffer))
+                source.close()
+
+            blobs, metadata = WORKER_TASKS[task](images, **kwargs)
+            del images
+
+            outputs = [SharedImage.create(blob, name=f'{prefix}_{index}') for index, blob in enumerate(blobs)]
+            del blobs
+
+        except Exception as e:
+            print(e, file=sys.stderr)
+            _discard_outputs(prefix)
+            connection.send(exceptions.ImageError())
+            continue
+
+        connection.send({'images': [output.handle for output in outputs], **metadata})
+        for output in outputs:
+            output.close()
+
+
+class ImageWorker:
+
+    __slots__ = 'process', 'connection', 'jobs'
+
+    def __init__(self, process: multiprocessing.Process, connection: multiprocessing.connection.Connection) -> None:
+
+        self.process = process
+        self.connection = connection
+
+        self.jobs: int = 0
+
+    def __repr__(self) -> str:
+        return f'<ImageWorker pid={self.process.pid} alive={self.process.is_alive()} jobs={self.jobs}>'
+
+    def kill(self) -> None:
+
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.connection.close()
+
+
+class GuildQueue:
+
+    __slots__ = 'jobs', 'running', 'finish'
+
+    def __init__(self) -> None:
+
+        # Waiting jobs as (cost, sequence, weight, future), so a guild's cheap jobs go out before its expensive ones.
+        self.jobs: list[tuple[int, int, int, asyncio.Future]] = []
+        self.running: int = 0
+        self.finish: float = 0
+
+    def __repr__(self) -> str:
+        return f'<GuildQueue jobs={len(self.jobs)} running={self.running} finish={self.finish}>'
+
+
+class ImagePool:
+
+    def __init__(self, *, size: int = None, timeout: float = 60, guild_limit: int = 2, notice_after: float = 5) -> None:
+
+        self.size: int = size or os.cpu_count() or 1
+        self.timeout: float = timeout
+        self.guild_limit: int = min(guild_limit, self.size)
+        self.notice_after: float = notice_after
+
+        self.workers: list[ImageWorker] = []
+        self.idle: collections.deque[ImageWorker] = collections.deque()
+
+        self.guilds: dict[int, GuildQueue] = {}
+        self.virtual_time: float = 0
+        self.sequence: itertools.count = itertools.count()
+
+        self.active: int = 0
+        self.stats: collections.Counter = collections.Counter()
+
+    def __repr__(self) -> str:
+        return f'<ImagePool size={self.size} idle={len(self.idle)} active={self.active} queued={self.queued}>'
+
+    #
+
+    def start(self) -> None:
+
+        # Workers have to share our resource tracker, otherwise each of them would unlink the shared memory they hand back to us when they exit.
+        resource_tracker.ensure_running()
+
+        for _ in range(self.size):
+            self.idle.append(self._spawn())
+
+    async def close(self) -> None:
 
-        image_buffer = io.BytesIO(image_bytes)
-        image_edited_buffer = io.BytesIO()
+        for worker in self.workers:
+            try:
+                worker.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
 
-        with Image(file=image_buffer) as image:
+        for worker in self.workers:
+            await asyncio.get_running_loop().run_in_executor(None, worker.process.join, 2)
+            worker.kill()
 
-            image_format = image.format
-            if image_format != 'GIF':
-                text = edit_function(image, **kwargs)
+        self.workers.clear()
+        self.idle.clear()
+        __log__.info('[IMAGE POOL] Closed image workers.')
+
+    def _spawn(self) -> ImageWorker:
+
+        parent_connection, child_connection = multiprocessing.Pipe()
+
+        process = multiprocessing.Process(target=_worker, daemon=True, args=(child_connection,))
+        process.start()
+        child_connection.close()
+
+        worker = ImageWorker(process=process, connection=parent_connection)
+        self.workers.append(worker)
+
+        return worker
+
+    def _replace(self, worker: ImageWorker) -> ImageWorker:
+
+        __log__.warning(f'[IMAGE POOL] Replacing image worker with pid \'{worker.process.pid}\' after {worker.jobs} jobs.')
+
+        worker.kill()
+        self.workers.remove(worker)
+        self.stats['restarted'] += 1
+
+        return self._spawn()
+
+    async def _receive(self, worker: ImageWorker) -> Any:
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = worker.connection.fileno()
+
+        def on_readable() -> None:
+
+            loop.remove_reader(fd)
+            if future.done():
+                return
+
+            try:
+                future.set_result(worker.connection.recv())
+            except Exception as error:
+                future.set_exception(error)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            return await future
+        finally:
+            loop.remove_reader(fd)
+
+    # Scheduling
+
+    def _dispatch(self) -> None:
+
+        # Start time fair queueing: every guild advances a virtual clock by the weight of each job it runs, and the next idle worker goes to
+        # the guild furthest behind. A guild flooding the bot only ever competes with itself, and cheap jobs move its clock the least.
+        while self.idle:
+
+            candidates = [guild for guild in self.guilds.values() if guild.jobs and guild.running < self.guild_limit]
+            if not candidates:
+                return
+
+            guild = min(candidates, key=lambda g: (max(g.finish, self.virtual_time), g.jobs[0][0], g.jobs[0][1]))
+            _, _, weight, future = heapq.heappop(guild.jobs)
+
+            start = max(guild.finish, self.virtual_time)
+            guild.finish = start + weight
+            self.virtual_time = start
+
+            guild.running += 1
+            future.set_result(self.idle.popleft())
+
+    def _release(self, guild_id: int, worker: ImageWorker) -> None:
+
+        guild = self.guilds[guild_id]
+        guild.running -= 1
+
+        if not guild.jobs and not guild.running:
+            del self.guilds[guild_id]
+
+        self.idle.append(worker)
+        self._dispatch()
+
+    def _position(self, entry: tuple[int, int, int, asyncio.Future]) -> int:
+
+        # Replays _dispatch over the jobs that are waiting, using the same virtual start tags, to count how many would go out before this one. The
+        # per guild worker limit depends on when running jobs finish, so it is left out and the position is a best guess rather than a promise.
+        virtual_time = self.virtual_time
+        queues = {guild_id: (guild.finish, sorted(guild.jobs, key=lambda job: job[:2])) for guild_id, guild in self.guilds.items() if guild.jobs}
+        heap = [(max(finish, virtual_time), jobs[0][0], jobs[0][1], guild_id, 0) for guild_id, (finish, jobs) in queues.items()]
+        heapq.heapify(heap)
+
+        position = 1
+
+        while heap:
+
+            start, _, sequence, guild_id, index = heapq.heappop(heap)
+            if sequence == entry[1]:
+                return position
+
+            finish, jobs = queues[guild_id]
+            finish = start + jobs[index][2]
+            virtual_time = start
+            queues[guild_id] = (finish, jobs)
+
+            if (index := index + 1) < len(jobs):
+                heapq.heappush(heap, (max(finish, virtual_time), jobs[index][0], jobs[index][1], guild_id, index))
+
+            position += 1
+
+        return position
+
+    async def _acquire(self, guild_id: int, cost: enums.ImageCost, notify: Optional[Callable[[int], Awaitable[Any]]]) -> ImageWorker:
+
+        if (guild := self.guilds.get(guild_id)) is None:
+            guild = self.guilds[guild_id] = GuildQueue()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (cost.value, next(self.sequence), COST_WEIGHTS[cost], future)
+
+        heapq.heappush(guild.jobs, entry)
+        self._dispatch()
+
+        try:
+            if notify and not future.done():
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), timeout=self.notice_after)
+                except asyncio.TimeoutError:
+                    await notify(self._position(entry))
+            return await future
+
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self._release(guild_id, future.result())
             else:
-                image.coalesce()
-                for x in image.sequence:
-                    with x as image_frame:
-                        text = edit_function(image_frame, **kwargs)
-                image.optimize_transparency()
+                future.cancel()
+                guild.jobs.remove(entry)
+                heapq.heapify(guild.jobs)
+                if not guild.jobs and not guild.running:
+                    del self.guilds[guild_id]
+            raise
+
+    #
+
+    @property
+    def queued(self) -> int:
+        return sum(len(guild.jobs) for guild in self.guilds.values())
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+
+        completed = self.stats['completed']
+        started = self.stats['started']
+
+        return {
+            'size':            self.size,
+            'alive':           sum(worker.process.is_alive() for worker in self.workers),
+            'idle':            len(self.idle),
+            'active':          self.active,
+            'queued':          self.queued,
+            'guilds':          len(self.guilds),
+            'completed':       completed,
+            'failed':          self.stats['failed'],
+            'timed_out':       self.stats['timed_out'],
+            'restarted':       self.stats['restarted'],
+            'average_ms':      round(self.stats['time_ms'] / completed, 2) if completed else 0,
+            'average_wait_ms': round(self.stats['wait_ms'] / started, 2) if started else 0,
+        }
+
+    async def submit(
+            self, task: str, images: list[Union[bytes, bytearray, SharedImage]], *, guild_id: int = 0, cost: enums.ImageCost = enums.ImageCost.MODERATE,
+            timeout: float = None, notify: Callable[[int], Awaitable[Any]] = None, **kwargs
+    ) -> dict[str, Any]:
+
+        queued = time.perf_counter()
+        worker = await self._acquire(guild_id, cost, notify)
+
+        if not worker.process.is_alive():
+            worker = self._replace(worker)
+
+        self.active += 1
+        start = time.perf_counter()
+        self.stats['started'] += 1
+        self.stats['wait_ms'] += (start - queued) * 1000
+
+        # Images that already live in shared memory (the output of an earlier job) are passed along as is, the caller owns those.
+        sources = [image if isinstance(image, SharedImage) else SharedImage.create(image) for image in images]
+        # Outputs get names we know up front, so if the result never reaches us they can still be found and unlinked once the worker is gone.
+        prefix = f'life_{secrets.token_hex(8)}'
+
+        try:
+            worker.connection.send((task, [source.handle for source in sources], prefix, kwargs))
+            data = await asyncio.wait_for(self._receive(worker), timeout=timeout or self.timeout)
+
+        except asyncio.TimeoutError:
+            self.stats['timed_out'] += 1
+            self._release(guild_id, self._replace(worker))
+            _discard_outputs(prefix)
+            raise exceptions.ImageError('Editing that image took too long, try a smaller image.')
+
+        except (EOFError, OSError):
+            self.stats['failed'] += 1
+            self._release(guild_id, self._replace(worker))
+            _discard_outputs(prefix)
+            raise exceptions.ImageError('Something went wrong while trying to edit that image.')
+
+        except BaseException:
+            # The worker may still be mid job if we got cancelled, so it can't be trusted with another one.
+            self._release(guild_id, self._replace(worker))
+            _discard_outputs(prefix)
+            raise
+
+        finally:
+            self.active -= 1
+            for source, image in zip(sources, images):
+                if source is not image:
+                    source.unlink()
+
+        worker.jobs += 1
+        self._release(guild_id, worker)
+
+        if isinstance(data, exceptions.ImageError):
+            self.stats['failed'] += 1
+            raise exceptions.ImageError('Something went wrong while trying to edit that image.')
+
+        self.stats['completed'] += 1
+        self.stats['time_ms'] += (time.perf_counter() - start) * 1000
+
+        data['images'] = [SharedImage.attach(*handle) for handle in data['images']]
+        return data
+
+
+def sniff_format(header: Union[bytes, bytearray]) -> Optional[str]:
+
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+
+    if header[4:8] == b'ftyp':
+        if header[8:12] in HEIC_BRANDS:
+            return 'heic'
+        if header[8:12] in AVIF_BRANDS:
+            return 'avif'
+
+    if _SVG_DOCUMENT.match(header[:SNIFF_SIZE]):
+        return 'svg'
+
+    return None
 
-            image.save(file=image_edited_buffer)
 
-        image_edited_buffer.seek(0)
+async def _find_og_url(response: aiohttp.ClientResponse) -> Optional[str]:
 
-        child_pipe.send({
-            'image': image_edited_buffer,
-            'image_format': image_format,
-            'text': text
-        })
+    page = bytearray()
+    position = 0
 
-        image_buffer.close()
-        image_edited_buffer.close()
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        page += chunk
+
+        for match in _META_TAG.finditer(page, position):
+            position = match.end()
+            if _OG_URL_PROPERTY.search(match.group()) and (content := _CONTENT_ATTRIBUTE.search(match.group())):
+                return html.unescape(content.group(1).decode(errors='replace'))
+
+        # og tags only ever live in the head, so there is no point reading the rest of the page.
+        if b'</head>' in page[position:].lower() or len(page) > MAX_PAGE_SIZE:
+            break
+
+    return None
 
-    except Exception as e:
-        print(e, file=sys.stderr)
-        child_pipe.send(exceptions.ImageError())
 
+async def _request_image_bytes(
+        *, ctx: context.Context, url: str, follow_pages: bool = True, validators: Optional[dict[str, str]] = None
+) -> tuple[Optional[bytearray], str, dict[str, str]]:
+    """
+    Downloads an image, returning its bytes, the url they actually came from and the validators (etag / last modified) it was served with. With
+    validators given the request is conditional, and if the image has not changed since they were taken no bytes are returned.
+    """
 
-async def _request_image_bytes(*, ctx: context.Context, url: str) -> bytes:
+    headers = {}
+    if validators:
+        if etag := validators.get('etag'):
+            headers['If-None-Match'] = etag
+        if last_modified := validators.get('last_modified'):
+            headers['If-Modified-Since'] = last_modified
 
-    async with ctx.bot.session.get(url) as request:
+    async with ctx.bot.session.get(url, headers=headers) as request:
 
-        if yarl.URL(url).host in COMMON_GIF_SITES:
-            page = bs4.BeautifulSoup(await request.text(), features='html.parser')
-            if (url := page.find("meta",  property="og:url")) is not None:
-                return await _request_image_bytes(ctx=ctx, url=url['content'])
+        if follow_pages and yarl.URL(url).host in COMMON_GIF_SITES:
+            if (url := await _find_og_url(request)) is not None:
+                return await _request_image_bytes(ctx=ctx, url=url, follow_pages=False)
+
+        if request.status == 304 and validators:
+            return None, str(request.url), validators
 
         if request.status != 200:
             raise exceptions.ImageError('Something went wrong while loading that image, check the url or try again later.')
-        if request.headers.get('Content-Type') not in VALID_CONTENT_TYPES:
-            raise exceptions.ImageError('That image format is not allowed. Valid formats include `gif`, `heic`, `jpeg`, `png`, `webp`, `avif` and `svg`.')
         if (content_length := request.headers.get('Content-Length', 0)) and int(content_length) > MAX_CONTENT_SIZE:
             raise exceptions.ImageError(f'That image was too big to edit, please keep to a `{humanize.naturalsize(MAX_CONTENT_SIZE)}` maximum')
 
-        return await request.read()
+        image_bytes = bytearray()
+        image_format = None
+
+        async for chunk in request.content.iter_chunked(CHUNK_SIZE):
+            image_bytes += chunk
+
+            # Content-Length can be missing or wrong, so the limit is enforced on what actually arrives.
+            if len(image_bytes) > MAX_CONTENT_SIZE:
+                raise exceptions.ImageError(f'That image was too big to edit, please keep to a `{humanize.naturalsize(MAX_CONTENT_SIZE)}` maximum')
+
+            if image_format is None and len(image_bytes) >= SNIFF_SIZE:
+                if (image_format := sniff_format(image_bytes)) is None:
+                    break
+
+        if image_format is None and sniff_format(image_bytes) is None:
+            raise exceptions.ImageError('That image format is not allowed. Valid formats include `gif`, `heic`, `jpeg`, `png`, `webp`, `avif` and `svg`.')
+
+        validators = {'etag': request.headers.get('ETag'), 'last_modified': request.headers.get('Last-Modified')}
+        return image_bytes, str(request.url), {key: value for key, value in validators.items() if value}
+
+
+class CDNUploader:
+
+    def __init__(self, *, connections: int = CDN_CONNECTIONS, attempts: int = CDN_ATTEMPTS, timeout: aiohttp.ClientTimeout = CDN_TIMEOUT) -> None:
+
+        self.attempts: int = attempts
+
+        # A connection pool of our own, so uploads keep their connections to the cdn alive and can't starve the rest of the bot's http.
+        self.session: aiohttp.ClientSession = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=connections, keepalive_timeout=60), timeout=timeout, headers=CDN_HEADERS
+        )
+
+        self.stats: collections.Counter = collections.Counter()
+        self.histogram: collections.Counter = collections.Counter()
+
+    def __repr__(self) -> str:
+        return f'<CDNUploader uploads={self.stats["uploaded"]} retries={self.stats["retries"]} failed={self.stats["failed"]}>'
 
+    #
 
-async def _upload_image(*, ctx: context.Context, image: io.BytesIO, image_format: str, text: str = None) -> discord.Embed:
+    async def close(self) -> None:
+        await self.session.close()
 
-    data = aiohttp.FormData()
-    data.add_field('file', image, filename=f'image.{image_format.lower()}')
+    def _record(self, elapsed: float) -> None:
 
-    async with ctx.bot.session.post(CDN_UPLOAD_URL, headers=CDN_HEADERS, data=data) as response:
+        elapsed_ms = elapsed * 1000
+        self.stats['time_ms'] += elapsed_ms
 
-        if response.status == 413:
-            raise exceptions.ImageError('The image produced was too large to upload.')
+        bucket = next((bucket for bucket in CDN_HISTOGRAM_BUCKETS if elapsed_ms <= bucket), None)
+        self.histogram[f'<= {bucket}ms' if bucket else f'> {CDN_HISTOGRAM_BUCKETS[-1]}ms'] += 1
 
-        post = await response.json()
+    @property
+    def metrics(self) -> dict[str, Any]:
+
+        uploaded = self.stats['uploaded']
+
+        metrics = {
+            'uploaded':          uploaded,
+            'retries':           self.stats['retries'],
+            'failed':            self.stats['failed'],
+            'average_upload_ms': round(self.stats['time_ms'] / uploaded, 2) if uploaded else 0,
+        }
+        for bucket in CDN_HISTOGRAM_BUCKETS:
+            metrics[f'upload <= {bucket}ms'] = self.histogram[f'<= {bucket}ms']
+        metrics[f'upload > {CDN_HISTOGRAM_BUCKETS[-1]}ms'] = self.histogram[f'> {CDN_HISTOGRAM_BUCKETS[-1]}ms']
+
+        return metrics
+
+    async def upload(self, image: memoryview, *, image_format: str) -> str:
+
+        start = time.perf_counter()
+
+        for attempt in range(self.attempts):
+
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(CDN_BACKOFF * 2 ** (attempt - 1) * random.uniform(1, 1.5))
+
+            # A form can only be sent once, but building one is cheap since the payload just wraps the worker's buffer without copying it.
+            data = aiohttp.FormData()
+            data.add_field('file', image, filename=f'image.{image_format.lower()}')
+
+            try:
+                async with self.session.post(CDN_UPLOAD_URL, data=data) as response:
+
+                    if response.status >= 500:
+                        __log__.warning(f'[CDN] Upload attempt {attempt + 1} failed with status {response.status}.')
+                        continue
+                    if response.status == 413:
+                        self.stats['failed'] += 1
+                        raise exceptions.ImageError('The image produced was too large to upload.')
+                    if response.status >= 400:
+                        self.stats['failed'] += 1
+                        __log__.error(f'[CDN] Upload was rejected with status {response.status}.')
+                        raise exceptions.ImageError('Something went wrong while trying to upload that image.')
+
+                    post = await response.json()
+
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as error:
+                __log__.warning(f'[CDN] Upload attempt {attempt + 1} failed: {error!r}')
+                continue
+
+            self.stats['uploaded'] += 1
+            self._record(time.perf_counter() - start)
+
+            return f'https://media.mrrandom.xyz/{post.get("filename")}'
+
+        self.stats['failed'] += 1
+        raise exceptions.ImageError('Something went wrong while trying to upload that image, try again later.')
+
+
+def _build_embed(*, ctx: context.Context, url: str, text: str = None) -> discord.Embed:
 
     embed = discord.Embed(colour=ctx.colour)
-    embed.set_image(url=f'https://media.mrrandom.xyz/{post.get("filename")}')
+    embed.set_image(url=url)
     if text:
         embed.set_footer(text=text)
 
-    image.close()
     return embed
 
 
+def _cache_key(digest: str, steps: list[tuple[str, dict]]) -> str:
+
+    # Numbers are normalised so that `radius=3` and `radius=3.0` share an entry.
+    steps = [
+        [edit_type, {key: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value for key, value in options.items()}]
+        for edit_type, options in steps
+    ]
+    return f'imaging:result:{digest}:{json.dumps(steps, sort_keys=True, default=str)}'
+
+
+async def _cache_get(*, ctx: context.Context, key: str) -> Any:
+
+    if (value := _cache.get(key)) is not None:
+        return value
+
+    try:
+        data = await ctx.bot.redis.get(key)
+    except aredis.RedisError as error:
+        __log__.warning(f'[IMAGE CACHE] Error while reading key \'{key}\' from redis: {error}')
+        return None
+
+    if data is None:
+        return None
+
+    value = json.loads(data)
+    _cache.set(key, value)
+    return value
+
+
+async def _cache_set(*, ctx: context.Context, key: str, value: Any, ttl: int) -> None:
+
+    _cache.set(key, value, ttl=ttl)
+
+    try:
+        await ctx.bot.redis.setex(name=key, time=ttl, value=json.dumps(value))
+    except aredis.RedisError as error:
+        __log__.warning(f'[IMAGE CACHE] Error while writing key \'{key}\' to redis: {error}')
+
+
 #
 
 
+def _footer(text: Optional[str], budget: Optional[str]) -> Optional[str]:
+    return ' | '.join(part for part in (text, budget) if part) or None
+
+
+async def _edit(*, ctx: context.Context, steps: list[tuple[str, dict]], image_bytes: bytearray, task: str = 'edit') -> tuple[SharedImage, str, Optional[str]]:
+
+    pool = ctx.bot.image_pool
+    # DMs don't have a guild, so they are queued per user instead.
+    guild_id = ctx.guild.id if ctx.guild else ctx.author.id
+    cost = max((IMAGE_OPERATIONS[edit_type][1] for edit_type, _ in steps), key=lambda cost: cost.value)
+
+    notice = None
+
+    async def notify(position: int) -> None:
+        nonlocal notice
+        try:
+            notice = await ctx.reply(f'Your image is in a queue at position `{position}`, it will be edited as soon as possible.')
+        except discord.HTTPException:
+            pass
+
+    try:
+        # Only Wand edits are split, the array backend is fast enough on whole images.
+        kwargs = {'chunks': pool.guild_limit} if task == 'edit' else {}
+        data = await pool.submit(task, [image_bytes], guild_id=guild_id, cost=cost, notify=notify, steps=steps, **kwargs)
+    finally:
+        if notice:
+            with contextlib.suppress(discord.HTTPException):
+                await notice.delete()
+
+    budget = data['budget']
+
+    if not data.get('split'):
+        return data['images'][0], data['image_format'], _footer(data['text'], budget)
+
+    chunks = data['images']
+    jobs = [asyncio.ensure_future(pool.submit('edit', [chunk], guild_id=guild_id, cost=cost, steps=steps, intermediate=True)) for chunk in chunks]
+
+    try:
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+
+    except BaseException:
+        # Cancelled part way through, the chunks that were already edited are ours to release.
+        for job in jobs:
+            if job.done() and not job.cancelled() and job.exception() is None:
+                for image in job.result()['images']:
+                    image.unlink()
+        raise
+
+    finally:
+        for chunk in chunks:
+            chunk.unlink()
+
+    edited = [result['images'][0] for result in results if not isinstance(result, BaseException)]
+    try:
+        if errors := [result for result in results if isinstance(result, BaseException)]:
+            raise errors[0]
+        joined = await pool.submit('join', edited, guild_id=guild_id, cost=cost, delays=data['delays'], disposes=data['disposes'], loop=data['loop'])
+    finally:
+        for image in edited:
+            image.unlink()
+
+    return joined['images'][0], joined['image_format'], _footer(results[-1]['text'], budget)
+
+
 async def edit_image(*, ctx: context.Context, edit_type: str,  url: str, **kwargs) -> discord.Embed:
+    return await edit_image_pipeline(ctx=ctx, url=url, steps=[(edit_type, kwargs)])
 
-    image_bytes = await _request_image_bytes(ctx=ctx, url=url)
-    parent_pipe, child_pipe = multiprocessing.Pipe()
 
-    process = multiprocessing.Process(target=_do_edit_image, daemon=True, args=(child_pipe, IMAGE_OPERATIONS[edit_type], image_bytes), kwargs=kwargs)
-    process.start()
+async def edit_image_pipeline(*, ctx: context.Context, url: str, steps: list[tuple[str, dict]]) -> discord.Embed:
 
-    data = await ctx.bot.loop.run_in_executor(None, parent_pipe.recv)
-    if isinstance(data, (exceptions.ImageError, EOFError)):
-        process.terminate()
-        raise exceptions.ImageError('Something went wrong while trying to edit that image.')
+    if not steps or len(steps) > MAX_PIPELINE_STEPS:
+        raise exceptions.ArgumentError(f'An image pipeline must have between `1` and `{MAX_PIPELINE_STEPS}` steps.')
 
-    process.join()
+    cacheable = all(edit_type not in UNCACHEABLE_OPERATIONS for edit_type, _ in steps)
+    url_key = f'imaging:source:{hashlib.sha1(url.encode()).hexdigest()}'
 
-    process.close()
-    parent_pipe.close()
-    child_pipe.close()
+    # A url we have seen recently maps to the hash of its content and the validators it was served with. The image is only downloaded again if the
+    # server says it has changed since, so a repeat edit of an unchanged image skips the download without ever serving stale content.
+    image_bytes = None
 
-    embed = await _upload_image(ctx=ctx, image=data['image'], image_format=data['image_format'], text=data['text'])
-    return embed
+    if cacheable and (source := await _cache_get(ctx=ctx, key=url_key)) is not None:
+        image_bytes, source_url, validators = await _request_image_bytes(ctx=ctx, url=source['url'], follow_pages=False, validators=source['validators'])
+        if image_bytes is None and (result := await _cache_get(ctx=ctx, key=_cache_key(source['digest'], steps))):
+            return _build_embed(ctx=ctx, url=result['url'], text=result['text'])
+
+    # Either a url we haven't seen, or an unchanged image whose result has since expired from the cache.
+    if image_bytes is None:
+        image_bytes, source_url, validators = await _request_image_bytes(ctx=ctx, url=url)
+
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    key = _cache_key(digest, steps)
+
+    if cacheable:
+        # Without validators there is no way to tell whether the content behind the url changed, so it is not remembered.
+        if validators:
+            await _cache_set(ctx=ctx, key=url_key, value={'url': source_url, 'digest': digest, 'validators': validators}, ttl=CACHE_URL_TTL)
+        if result := await _cache_get(ctx=ctx, key=key):
+            return _build_embed(ctx=ctx, url=result['url'], text=result['text'])
+
+    task = 'array_edit' if array_imaging.supports(steps, sniff_format(image_bytes[:SNIFF_SIZE])) else 'edit'
+
+    image, image_format, text = await _edit(ctx=ctx, steps=steps, image_bytes=image_bytes, task=task)
+    del image_bytes
+
+    try:
+        image_url = await ctx.bot.cdn.upload(image.buffer, image_format=image_format)
+    finally:
+        image.unlink()
+
+    if cacheable:
+        await _cache_set(ctx=ctx, key=key, value={'url': image_url, 'text': text}, ttl=CACHE_RESULT_TTL)
+
+    return _build_embed(ctx=ctx, url=image_url, text=text)
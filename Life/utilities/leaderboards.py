@@ -0,0 +1,101 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+from typing import Iterable, Iterator, Optional
+
+from sortedcontainers import SortedList
+
+__all__ = ['RankIndex', 'GuildRanks']
+
+
+class RankIndex:
+
+    # Users ordered by a value, highest first, with ties going to the lower id. Keys are stored as (-value, id) so the sorted list's natural order
+    # is the leaderboard order, which makes a rank lookup a bisect and a page of the leaderboard a slice.
+
+    __slots__ = '_keys', '_values'
+
+    def __init__(self, items: Iterable[tuple[int, int]] = ()) -> None:
+
+        self._values: dict[int, int] = dict(items)
+        self._keys: SortedList = SortedList((-value, user_id) for user_id, value in self._values.items())
+
+    def __repr__(self) -> str:
+        return f'<RankIndex size={len(self._values)}>'
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._values
+
+    #
+
+    def get(self, user_id: int) -> Optional[int]:
+        return self._values.get(user_id)
+
+    def set(self, user_id: int, value: int) -> None:
+
+        if (old := self._values.get(user_id)) == value:
+            return
+
+        if old is not None:
+            self._keys.remove((-old, user_id))
+
+        self._keys.add((-value, user_id))
+        self._values[user_id] = value
+
+    def discard(self, user_id: int) -> None:
+
+        if (old := self._values.pop(user_id, None)) is not None:
+            self._keys.remove((-old, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+
+        if (value := self._values.get(user_id)) is None:
+            return None
+
+        return self._keys.bisect_left((-value, user_id)) + 1
+
+    def top(self, start: int = 0, stop: Optional[int] = None) -> Iterator[tuple[int, int]]:
+        """
+        Yields (user_id, value) pairs in leaderboard order, between the given (zero based) positions.
+        """
+
+        for value, user_id in self._keys.islice(start, stop):
+            yield user_id, -value
+
+
+class GuildRanks:
+
+    # The rank indexes of a single guild. Only members are ever added, so guild leaderboards and ranks cost time in the size of the guild rather than
+    # the number of users the bot knows about.
+
+    __slots__ = 'member_ids', 'xp', 'coins', 'accessed'
+
+    def __init__(self, member_ids: Iterable[int], *, xp: dict[int, int], coins: dict[int, int], accessed: float) -> None:
+
+        self.member_ids: set[int] = set(member_ids)
+
+        self.xp: RankIndex = RankIndex(xp.items())
+        self.coins: RankIndex = RankIndex(coins.items())
+
+        self.accessed: float = accessed
+
+    def __repr__(self) -> str:
+        return f'<GuildRanks members={len(self.member_ids)} ranked={len(self.xp)}>'
+
+    def discard(self, user_id: int) -> None:
+
+        self.member_ids.discard(user_id)
+        self.xp.discard(user_id)
+        self.coins.discard(user_id)
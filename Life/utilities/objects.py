@@ -10,53 +10,96 @@
 #  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
 #
 
-import asyncio
+import datetime as dt
 import math
-from typing import Optional
+import sys
+from typing import Any, Optional
 
 import discord
 import pendulum
 from pendulum import DateTime
 from pendulum.tz.timezone import Timezone
 
-from utilities import enums
+from utilities import enums, timezones
 
 __all__ = ['DefaultUserConfig', 'UserConfig', 'DefaultGuildConfig', 'GuildConfig', 'Reminder', 'Todo', 'Tag']
 
+_EPOCH = dt.datetime(1970, 1, 1)
+_EPOCH_UTC = _EPOCH.replace(tzinfo=dt.timezone.utc)
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+def _to_epoch(value: dt.datetime) -> int:
+    # Naive timestamps from the database are in UTC.
+    return (value - (_EPOCH_UTC if value.tzinfo else _EPOCH)) // _MICROSECOND
+
+
+def level_for(xp: int) -> int:
+    return math.floor((((xp / 100) ** (1.0 / 1.5)) / 3))
+
+
+class _Timestamp:
+
+    # Keeps a timestamp as epoch microseconds in the `_<name>` slot and only builds a pendulum DateTime for it, cached in `_<name>_cache`, when it
+    # is actually read.
+
+    __slots__ = 'raw', 'cache'
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.raw = f'_{name}'
+        self.cache = f'_{name}_cache'
+
+    def __get__(self, instance: Any, owner: type = None) -> Any:
+
+        if instance is None:
+            return self
+
+        if (value := getattr(instance, self.cache)) is None:
+            value = pendulum.instance(_EPOCH_UTC + dt.timedelta(microseconds=getattr(instance, self.raw)))
+            setattr(instance, self.cache, value)
+
+        return value
+
+    def __set__(self, instance: Any, value: dt.datetime) -> None:
+        setattr(instance, self.raw, _to_epoch(value))
+        setattr(instance, self.cache, value)
+
 
 class DefaultUserConfig:
 
-    __slots__ = 'data', 'id', 'created_at', 'blacklisted', 'blacklisted_reason', 'colour', 'timezone', 'timezone_private', 'birthday', 'birthday_private', 'xp', 'coins', \
+    __slots__ = 'id', 'created_at', 'blacklisted', 'blacklisted_reason', 'colour', 'timezone', 'timezone_private', 'birthday', 'birthday_private', 'xp', 'coins', \
                 'daily_collected', 'daily_streak', 'weekly_collected', 'weekly_streak', 'monthly_collected', 'monthly_streak', 'notifications', 'reminders', 'todos', \
                 'requires_db_update'
 
     def __init__(self) -> None:
-        self.data = None
+
+        utc = timezones.registry.get('UTC')
+        now = pendulum.now(tz=utc)
 
         self.id: int = 0
-        self.created_at: DateTime = pendulum.now(tz='UTC')
+        self.created_at: DateTime = now
 
         self.blacklisted: bool = False
         self.blacklisted_reason: Optional[str] = None
 
         self.colour: discord.Colour = discord.Colour.gold()
 
-        self.timezone: Timezone = pendulum.timezone('UTC')
+        self.timezone: Timezone = utc
         self.timezone_private: bool = False
 
-        self.birthday: DateTime = pendulum.DateTime(2020, 1, 1, tzinfo=pendulum.timezone('UTC'))
+        self.birthday: DateTime = pendulum.DateTime(2020, 1, 1, tzinfo=utc)
         self.birthday_private: bool = False
 
         self.xp: int = 0
         self.coins: int = 0
 
-        self.daily_collected: DateTime = pendulum.now(tz='UTC')
+        self.daily_collected: DateTime = now
         self.daily_streak: int = 0
 
-        self.weekly_collected: DateTime = pendulum.now(tz='UTC')
+        self.weekly_collected: DateTime = now
         self.weekly_streak: int = 0
 
-        self.monthly_collected: DateTime = pendulum.now(tz='UTC')
+        self.monthly_collected: DateTime = now
         self.monthly_streak: int = 0
 
         self.notifications: Notifications = Notifications(data={})
@@ -72,37 +115,51 @@ class DefaultUserConfig:
 
 class UserConfig:
 
-    __slots__ = 'data', 'id', 'created_at', 'blacklisted', 'blacklisted_reason', 'colour', 'timezone', 'timezone_private', 'birthday', 'birthday_private', 'xp', 'coins', \
-                'daily_collected', 'daily_streak', 'weekly_collected', 'weekly_streak', 'monthly_collected', 'monthly_streak', 'notifications', 'reminders', 'todos', \
+    # Everything is kept as the plain ints and strings that came out of the database, the pendulum and discord objects built from them
+    # are only created (and then cached) when something reads them, and timezones are shared through the registry. Most configs are only ever touched
+    # for their xp and coins.
+    __slots__ = 'id', '_created_at', '_created_at_cache', 'blacklisted', 'blacklisted_reason', '_colour', '_timezone', 'timezone_private', \
+                '_birthday', '_birthday_cache', 'birthday_private', 'xp', 'coins', '_daily_collected', '_daily_collected_cache', 'daily_streak', '_weekly_collected', \
+                '_weekly_collected_cache', 'weekly_streak', '_monthly_collected', '_monthly_collected_cache', 'monthly_streak', 'notifications', 'reminders', 'todos', \
                 'requires_db_update'
 
+    created_at = _Timestamp()
+    daily_collected = _Timestamp()
+    weekly_collected = _Timestamp()
+    monthly_collected = _Timestamp()
+
     def __init__(self, data: dict) -> None:
-        self.data = data
 
         self.id: int = data.get('id')
-        self.created_at: DateTime = pendulum.instance(data.get('created_at'), tz='UTC')
+
+        self._created_at: int = _to_epoch(data.get('created_at'))
+        self._created_at_cache: Optional[DateTime] = None
 
         self.blacklisted: bool = data.get('blacklisted')
         self.blacklisted_reason: Optional[str] = data.get('blacklisted_reason')
 
-        self.colour: discord.Colour = discord.Colour(int(data.get('colour'), 16))
+        self._colour: int = int(data.get('colour'), 16)
 
-        self.timezone: Timezone = pendulum.timezone(data.get('timezone'))
+        self._timezone: str = sys.intern(data.get('timezone'))
         self.timezone_private: bool = data.get('timezone_private')
 
-        self.birthday: DateTime = pendulum.parse(data.get('birthday').isoformat(), tz='UTC')
+        self._birthday: int = data.get('birthday').toordinal()
+        self._birthday_cache: Optional[DateTime] = None
         self.birthday_private: bool = data.get('birthday_private')
 
         self.xp: int = data.get('xp')
         self.coins: int = data.get('coins')
 
-        self.daily_collected: DateTime = pendulum.instance(data.get('daily_collected'), tz='UTC')
+        self._daily_collected: int = _to_epoch(data.get('daily_collected'))
+        self._daily_collected_cache: Optional[DateTime] = None
         self.daily_streak: int = data.get('daily_streak')
 
-        self.weekly_collected: DateTime = pendulum.instance(data.get('weekly_collected'), tz='UTC')
+        self._weekly_collected: int = _to_epoch(data.get('weekly_collected'))
+        self._weekly_collected_cache: Optional[DateTime] = None
         self.weekly_streak: int = data.get('weekly_streak')
 
-        self.monthly_collected: DateTime = pendulum.instance(data.get('monthly_collected'), tz='UTC')
+        self._monthly_collected: int = _to_epoch(data.get('monthly_collected'))
+        self._monthly_collected_cache: Optional[DateTime] = None
         self.monthly_streak: int = data.get('monthly_streak')
 
         self.notifications: Optional[Notifications] = None
@@ -115,6 +172,36 @@ class UserConfig:
     def __repr__(self) -> str:
         return f'<UserConfig id=\'{self.id}\' blacklisted={self.blacklisted} colour={self.colour} xp={self.xp} level={self.level}>'
 
+    @property
+    def colour(self) -> discord.Colour:
+        return discord.Colour(self._colour)
+
+    @colour.setter
+    def colour(self, value: discord.Colour) -> None:
+        self._colour = value.value
+
+    @property
+    def timezone(self) -> Timezone:
+        return timezones.registry.get(self._timezone)
+
+    @timezone.setter
+    def timezone(self, value: Timezone) -> None:
+        self._timezone = sys.intern(value.name)
+
+    @property
+    def birthday(self) -> DateTime:
+
+        if self._birthday_cache is None:
+            date = dt.date.fromordinal(self._birthday)
+            self._birthday_cache = pendulum.datetime(date.year, date.month, date.day, tz='UTC')
+
+        return self._birthday_cache
+
+    @birthday.setter
+    def birthday(self, value: DateTime) -> None:
+        self._birthday = value.toordinal()
+        self._birthday_cache = value
+
     @property
     def time(self) -> DateTime:
         return pendulum.now(tz=self.timezone)
@@ -133,7 +220,7 @@ class UserConfig:
 
     @property
     def level(self) -> int:
-        return math.floor((((self.xp / 100) ** (1.0 / 1.5)) / 3))
+        return level_for(self.xp)
 
     @property
     def next_level_xp(self) -> int:
@@ -188,7 +275,7 @@ class GuildConfig:
 
 class Reminder:
 
-    __slots__ = 'data', 'id', 'user_id', 'channel_id', 'created_at', 'datetime', 'content', 'jump_url', 'repeat_type', 'notified', 'task'
+    __slots__ = 'data', 'id', 'user_id', 'channel_id', 'created_at', 'datetime', 'content', 'jump_url', 'repeat_type', 'notified', 'occurrences'
 
     def __init__(self, data: dict) -> None:
         self.data = data
@@ -202,8 +289,7 @@ class Reminder:
         self.jump_url: str = data.get('jump_url')
         self.repeat_type: enums.ReminderRepeatType = enums.ReminderRepeatType(value=data.get('repeat_type'))
         self.notified: bool = data.get('notified')
-
-        self.task: Optional[asyncio.Task] = None
+        self.occurrences: int = data.get('occurrences') or 0
 
     def __repr__(self) -> str:
         return f'<Reminder id=\'{self.id}\' user_id=\'{self.user_id}\' datetime={self.datetime} done={self.done}>'
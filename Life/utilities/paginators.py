@@ -373,3 +373,62 @@ class EmbedsPaginator:
 
         self.page = len(self.entries) - 1
         await self.message.edit(embed=self.entries[self.page])
+
+
+class LazyEmbedPaginator(EmbedPaginator):
+
+    # An EmbedPaginator whose pages are not known up front. `fetch` is awaited with the number of the page that is needed and returns its entries,
+    # or an empty list once there are no more. Pages are always fetched in order and kept once fetched, so going back never fetches anything again.
+
+    def __init__(self, **kwargs) -> None:
+
+        self.fetch = kwargs.pop('fetch')
+        self.exhausted = False
+
+        super().__init__(entries=[], **kwargs)
+
+    @property
+    def embed_footer(self) -> str:
+        additional_footer = f'| {self.kwargs.get("embed_add_footer")}' if self.kwargs.get('embed_add_footer') else ''
+        return self.kwargs.get('embed_footer', f'\n\nPage: {self.page + 1}/{len(self.pages)}{"" if self.exhausted else "+"} {additional_footer}')
+
+    async def fetch_page(self, page: int) -> bool:
+        """
+        Fetches pages up to and including the given one, returns whether it exists.
+        """
+
+        while len(self.pages) <= page and self.exhausted is False:
+
+            if not (entries := [str(entry) for entry in await self.fetch(len(self.pages))]):
+                self.exhausted = True
+                break
+
+            self.entries.extend(entries)
+            self.pages.append('\n'.join(entries))
+
+        return len(self.pages) > page
+
+    async def react(self) -> None:
+
+        if self.exhausted and len(self.pages) == 1:
+            await self.message.add_reaction(':stop:737826951980646491')
+        else:
+            for emote in self.buttons:
+                await self.message.add_reaction(emote)
+
+    async def paginate(self) -> None:
+
+        await self.fetch_page(0)
+        self.embed.set_footer(text=self.embed_footer)
+
+        await super().paginate()
+
+    async def forward(self) -> None:
+
+        await self.fetch_page(self.page + 1)
+        await super().forward()
+
+    async def last(self) -> None:
+        # Jumps to the furthest page fetched so far rather than fetching everything that is left.
+        await self.fetch_page(self.page + 1)
+        await super().last()
@@ -0,0 +1,92 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+import math
+import time
+from typing import Hashable
+
+__all__ = ['TimerWheel']
+
+
+class TimerWheel:
+
+    # Keys that come due at a wall clock time within a fixed horizon. Each key sits in the slot of the tick it is due in, so adding, cancelling and
+    # moving a key are all O(1) and collecting what is due only looks at the slots of the ticks that have passed. Keys further out than the horizon
+    # are refused, whoever owns them has to add them again once they are close enough.
+
+    __slots__ = 'horizon', 'resolution', '_slots', '_due', '_tick'
+
+    def __init__(self, *, horizon: float, resolution: float = 1.0) -> None:
+
+        self.horizon: float = horizon
+        self.resolution: float = resolution
+
+        # One spare slot so that the slot of a key due right at the horizon is never the one being collected.
+        self._slots: list[set[Hashable]] = [set() for _ in range(math.ceil(horizon / resolution) + 2)]
+        self._due: dict[Hashable, int] = {}
+        self._tick: int = math.floor(time.time() / resolution)
+
+    def __repr__(self) -> str:
+        return f'<TimerWheel size={len(self._due)} horizon={self.horizon} resolution={self.resolution}>'
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._due
+
+    #
+
+    def add(self, key: Hashable, when: float) -> bool:
+        """
+        Schedules the key for the given unix timestamp, replacing any time it already had. Returns False if that is beyond the horizon.
+        """
+
+        # Anything that is already overdue is due on the next collection.
+        tick = max(math.ceil(when / self.resolution), self._tick + 1)
+
+        if tick - self._tick >= len(self._slots) - 1:
+            self.discard(key)
+            return False
+
+        self.discard(key)
+        self._due[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+        return True
+
+    def discard(self, key: Hashable) -> None:
+
+        if (tick := self._due.pop(key, None)) is not None:
+            self._slots[tick % len(self._slots)].discard(key)
+
+    def pop_due(self, now: float = None) -> list[Hashable]:
+        """
+        Removes and returns every key that is due by now, in the order they came due.
+        """
+
+        tick = math.floor((time.time() if now is None else now) / self.resolution)
+        due = []
+
+        # Every key is due within one turn of the wheel from the last collection, so a long gap never needs more than one pass over the slots.
+        for passed in range(self._tick + 1, min(tick, self._tick + len(self._slots)) + 1):
+
+            slot = self._slots[passed % len(self._slots)]
+            if not slot:
+                continue
+
+            due.extend(slot)
+            for key in slot:
+                del self._due[key]
+            slot.clear()
+
+        self._tick = max(self._tick, tick)
+        return due
@@ -0,0 +1,105 @@
+#  Life
+#  Copyright (C) 2020 Axel#3456
+#
+#  Life is free software: you can redistribute it and/or modify it under the terms of the GNU Affero General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later version.
+#
+#  Life is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+#  PARTICULAR PURPOSE.  See the GNU Affero General Public License for more details.
+#
+#  You should have received a copy of the GNU Affero General Public License along with Life. If not, see https://www.gnu.org/licenses/.
+#
+
+import sys
+import time
+from typing import Iterable, Optional
+
+import pendulum
+from pendulum.tz.timezone import Timezone
+
+__all__ = ['TimezoneRegistry', 'registry']
+
+# Every DST (and other offset) transition in the tz database falls on a quarter of an hour, so offsets worked out at one can't change before the next.
+_REFRESH_INTERVAL = 900
+
+
+class TimezoneRegistry:
+
+    __slots__ = '_zones', '_offsets', '_expires_at', '_users'
+
+    def __init__(self) -> None:
+
+        self._zones: dict[str, Timezone] = {}
+        self._offsets: dict[str, int] = {}
+        self._expires_at: float = 0
+
+        # Which users (of the configs currently in memory) are in each zone.
+        self._users: dict[str, set[int]] = {}
+
+    def __repr__(self) -> str:
+        return f'<TimezoneRegistry zones={len(self._zones)} users={sum(len(users) for users in self._users.values())}>'
+
+    #
+
+    def get(self, name: str) -> Timezone:
+
+        if (timezone := self._zones.get(name)) is None:
+            timezone = self._zones[sys.intern(name)] = pendulum.timezone(name)
+
+        return timezone
+
+    def offset(self, name: str) -> int:
+        """
+        The current UTC offset of a zone in seconds.
+        """
+
+        if (now := time.time()) >= self._expires_at:
+            self._offsets.clear()
+            self._expires_at = now - now % _REFRESH_INTERVAL + _REFRESH_INTERVAL
+
+        if (offset := self._offsets.get(name)) is None:
+            offset = self._offsets[name] = pendulum.now(tz=self.get(name)).offset
+
+        return offset
+
+    def now(self, name: str) -> pendulum.DateTime:
+        return pendulum.now(tz=self.get(name))
+
+    #
+
+    def add_user(self, user_id: int, name: str) -> None:
+        self._users.setdefault(sys.intern(name), set()).add(user_id)
+
+    def remove_user(self, user_id: int, name: str) -> None:
+
+        if (users := self._users.get(name)) is None:
+            return
+
+        users.discard(user_id)
+        if not users:
+            del self._users[name]
+
+    def move_user(self, user_id: int, old: str, new: str) -> None:
+
+        if old == new:
+            return
+
+        self.remove_user(user_id, old)
+        self.add_user(user_id, new)
+
+    def users(self, name: str) -> set[int]:
+        return self._users.get(name, set())
+
+    def group(self, user_ids: Iterable[int], *, exclude: Optional[set[str]] = None) -> list[tuple[str, set[int]]]:
+        """
+        Groups the given users by zone, ordered by each zone's current UTC offset. Only the in-memory configs that have been added here are seen.
+        """
+
+        user_ids = user_ids if isinstance(user_ids, (set, frozenset)) else set(user_ids)
+        exclude = exclude or set()
+
+        groups = [(name, users & user_ids) for name, users in self._users.items() if name not in exclude]
+        return sorted(((name, users) for name, users in groups if users), key=lambda group: (self.offset(group[0]), group[0]))
+
+
+registry = TimezoneRegistry()